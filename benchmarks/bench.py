@@ -0,0 +1,153 @@
+"""
+Benchmark the pipeline engine against a simulated client.
+
+Runs the README pipelines over a batch of queries at several concurrency
+levels and reports throughput, end-to-end latency percentiles, orchestration
+overhead per LLM call and peak memory as JSON, so results can be diffed
+across releases.
+
+Usage:
+    python benchmarks/bench.py --queries 200 --concurrency 1 16 64 --out bench.json
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+from sim import Profile, SimClient
+
+import mixture_llm
+from mixture_llm import Aggregate, Dropout, Propose, Retry, Shuffle, Synthesize, run_many
+
+PROPOSERS = [
+    "wizardlm-2-8x22b",
+    "qwen1.5-110b-chat",
+    "qwen1.5-72b-chat",
+    "llama-3-70b-instruct",
+    "mixtral-8x22b-instruct",
+    "dbrx-instruct",
+]
+
+PIPELINES = {
+    "together_moa": [
+        Propose(PROPOSERS, temp=0.7, max_tokens=512),
+        Synthesize(PROPOSERS, temp=0.7, max_tokens=512),
+        Synthesize(PROPOSERS, temp=0.7, max_tokens=512),
+        Aggregate("qwen1.5-110b-chat"),
+    ],
+    "moa_lite": [
+        Propose(PROPOSERS, temp=0.7, max_tokens=512),
+        Synthesize(PROPOSERS, temp=0.7, max_tokens=512),
+        Aggregate("qwen1.5-72b-chat"),
+    ],
+    "self_moa": [
+        Propose(["qwen1.5-110b-chat"] * 6, temp=0.7),
+        Aggregate("qwen1.5-110b-chat"),
+    ],
+    "robust_moa": [
+        Propose(PROPOSERS[:4]),
+        Shuffle(),
+        Dropout(0.2),
+        Aggregate("qwen1.5-110b-chat"),
+    ],
+}
+
+# Slower, heavier-tailed and rate-limited models alongside the default profile
+PROFILES = {
+    "wizardlm-2-8x22b": Profile(median=2.5, sigma=0.7, tail=0.05),
+    "dbrx-instruct": Profile(median=2.0, error_rate=0.05),
+    "qwen1.5-110b-chat": Profile(median=1.8, rpm=600),
+}
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+
+async def measure(pipeline, client, queries, concurrency, retry):
+    latencies, calls, errors = [], 0, 0
+    t0 = time.perf_counter()
+    async for _, _, history in run_many(
+        pipeline, queries, client, concurrency=concurrency, retry=retry
+    ):
+        latencies.append(sum(h["step_time"] for h in history))
+        for h in history:
+            calls += len(h["llm_calls"])
+            errors += sum("error" in c for c in h["llm_calls"])
+    return time.perf_counter() - t0, latencies, calls, errors
+
+
+async def bench(name, pipeline, n, concurrency, time_scale, retry):
+    queries = [f"Query {i}: explain topic {i % 37} in detail." for i in range(n)]
+
+    # Zero-latency, error-free pass: wall time is pure orchestration overhead
+    instant = SimClient(default=Profile(median=0, tail=0, error_rate=0), time_scale=0)
+    wall, _, calls, _ = await measure(pipeline, instant, queries, concurrency, None)
+    overhead = wall / max(calls, 1)
+
+    client = SimClient(PROFILES, time_scale=time_scale)
+    tracemalloc.start()
+    wall, latencies, calls, errors = await measure(pipeline, client, queries, concurrency, retry)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "pipeline": name,
+        "concurrency": concurrency,
+        "queries": n,
+        "throughput_qps": n / wall,
+        "latency_p50": percentile(latencies, 0.50),
+        "latency_p95": percentile(latencies, 0.95),
+        "latency_p99": percentile(latencies, 0.99),
+        "llm_calls": calls,
+        "errors": errors,
+        "overhead_us_per_call": overhead * 1e6,
+        "peak_memory_mb": peak / 2**20,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16, 64])
+    parser.add_argument("--pipelines", nargs="+", choices=list(PIPELINES), default=list(PIPELINES))
+    parser.add_argument("--time-scale", type=float, default=0.01)
+    parser.add_argument("--retry", action="store_true", help="Retry errors and 429s")
+    parser.add_argument("--out", help="Write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    retry = Retry(backoff=0.5 * args.time_scale) if args.retry else None
+    results = []
+    for name in args.pipelines:
+        for c in args.concurrency:
+            result = await bench(name, PIPELINES[name], args.queries, c, args.time_scale, retry)
+            results.append(result)
+            print(
+                f"{name:>13} c={c:<4} {result['throughput_qps']:8.1f} q/s  "
+                f"p50={result['latency_p50']:.3f}s p99={result['latency_p99']:.3f}s  "
+                f"overhead={result['overhead_us_per_call']:.0f}us/call  "
+                f"mem={result['peak_memory_mb']:.1f}MB",
+                file=sys.stderr,
+            )
+
+    report = {
+        "version": mixture_llm.__version__,
+        "python": platform.python_version(),
+        "time_scale": args.time_scale,
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,75 @@
+"""
+Simulated LLM client for benchmarking the pipeline engine without network calls.
+"""
+
+import asyncio
+import math
+import random
+from collections import deque
+from typing import NamedTuple
+
+
+class Profile(NamedTuple):
+    median: float = 1.5  # Median latency in seconds
+    sigma: float = 0.5  # Lognormal shape; larger means a heavier tail
+    tail: float = 0.02  # Probability of a straggler
+    tail_factor: float = 8.0  # Straggler latency multiplier
+    error_rate: float = 0.01  # Probability of a 5xx error
+    rpm: int | None = None  # Requests per minute before answering 429
+    out_ratio: float = 0.5  # Output tokens per input token
+    min_out: int = 32
+
+
+class SimError(Exception):
+    def __init__(self, status_code: int, message: str):
+        super().__init__(f"Error code: {status_code} - {message}")
+        self.status_code = status_code
+
+
+class SimClient:
+    """Fake `Client` with per-model latency, error and rate-limit behaviour.
+
+    Latencies are scaled by `time_scale` so a benchmark of realistic
+    multi-second calls can run in a fraction of the time.
+    """
+
+    def __init__(self, profiles=None, default=None, time_scale=0.01, seed=0):
+        self.profiles = profiles or {}
+        self.default = default or Profile()
+        self.time_scale = time_scale
+        self.rng = random.Random(seed)
+        self.calls = 0
+        self.busy = 0.0  # Simulated seconds spent inside calls
+        self._recent = {}
+
+    def _latency(self, p):
+        latency = p.median * math.exp(self.rng.gauss(0, p.sigma))
+        if self.rng.random() < p.tail:
+            latency *= p.tail_factor
+        return latency * self.time_scale
+
+    def _limited(self, model, p, now):
+        if p.rpm is None:
+            return False
+        window = self._recent.setdefault(model, deque())
+        while window and now - window[0] > 60 * self.time_scale:
+            window.popleft()
+        if len(window) >= p.rpm:
+            return True
+        window.append(now)
+        return False
+
+    async def __call__(self, *, model, messages, temp, max_tokens):
+        p = self.profiles.get(model, self.default)
+        self.calls += 1
+        if self._limited(model, p, asyncio.get_running_loop().time()):
+            raise SimError(429, "rate limit exceeded")
+        latency = self._latency(p)
+        self.busy += latency
+        if latency:
+            await asyncio.sleep(latency)
+        if self.rng.random() < p.error_rate:
+            raise SimError(502, "bad gateway")
+        in_tok = sum(len(m["content"]) for m in messages) // 4
+        out_tok = min(max_tokens, max(p.min_out, int(in_tok * p.out_ratio)))
+        return f"{model}: " + "tok " * out_tok, in_tok, out_tok
@@ -60,12 +60,19 @@ def print_results(pipeline: list, query: str, result: str, history: list) -> Non
             print(f"\n  {step['step']}:")
             for call in step["llm_calls"]:
                 status = "✓" if "error" not in call else f"✗ {call['error']}"
+                if call.get("cached"):
+                    status += " (cached)"
+                elif call.get("coalesced"):
+                    status += " (shared)"
                 tokens = f"{call['in_tokens']:,} in / {call['out_tokens']:,} out"
                 print(f"    {call['model']}: {call['time']:.2f}s | {tokens} | {status}")
 
-    # Show totals
-    total_in = sum(c["in_tokens"] for h in history for c in h["llm_calls"])
-    total_out = sum(c["out_tokens"] for h in history for c in h["llm_calls"])
+    # Show totals (cache hits and shared in-flight calls cost nothing)
+    billed = [
+        c for h in history for c in h["llm_calls"] if not c.get("cached") and not c.get("coalesced")
+    ]
+    total_in = sum(c["in_tokens"] for c in billed)
+    total_out = sum(c["out_tokens"] for c in billed)
     total_time = sum(h["step_time"] for h in history)
     print(f"\n{'=' * 60}")
     print("TOTALS:")
@@ -5,29 +5,55 @@ from __future__ import annotations
 from importlib.metadata import PackageNotFoundError
 from importlib.metadata import version as _version
 
+from .budget import Budget
+from .cache import Cache
+from .checkpoint import FileCheckpoint, MemoryCheckpoint
+from .coalesce import SingleFlight
 from .core import (
     Aggregate,
+    CallEnd,
+    Dedupe,
+    Done,
     Dropout,
     Filter,
+    Gate,
     Map,
     Propose,
     Rank,
     Refine,
+    Route,
     Sample,
     Shuffle,
+    StepEnd,
+    StepStart,
     Synthesize,
     Take,
+    Token,
     Vote,
     run,
+    run_many,
+    run_stream,
 )
+from .graph import Node, run_graph
+from .history import History
+from .hooks import Hooks
+from .plan import Plan, compile
+from .retry import Retry
+from .router import Router
+from .scheduler import Limit, Scheduler
+from .workers import Workers
 
 __all__ = [
     "Shuffle",
     "Dropout",
     "Sample",
     "Take",
+    "Dedupe",
     "Filter",
     "Map",
+    "Gate",
+    "Route",
+    "Router",
     "Propose",
     "Synthesize",
     "Aggregate",
@@ -35,6 +61,28 @@ __all__ = [
     "Rank",
     "Vote",
     "run",
+    "run_many",
+    "run_stream",
+    "run_graph",
+    "Node",
+    "compile",
+    "Plan",
+    "StepStart",
+    "CallEnd",
+    "Token",
+    "StepEnd",
+    "Done",
+    "History",
+    "Scheduler",
+    "Limit",
+    "Cache",
+    "SingleFlight",
+    "MemoryCheckpoint",
+    "FileCheckpoint",
+    "Budget",
+    "Retry",
+    "Hooks",
+    "Workers",
     "__version__",
 ]
 
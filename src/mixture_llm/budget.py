@@ -0,0 +1,70 @@
+"""Input-token budgets for steps that show models every previous response."""
+
+from __future__ import annotations
+
+from collections.abc import Callable
+from typing import NamedTuple
+
+from .similarity import clusters
+
+Counter = Callable[[str], int]
+Strategy = Callable[[list[str], int, Counter], list[str]]
+
+ELLIPSIS = " [...]"
+
+
+def estimate(text: str) -> int:
+    """Rough token count (~4 characters per token); pass a real tokenizer for accuracy."""
+    return len(text) // 4
+
+
+def _cut(text: str, tokens: int, count: Counter) -> str:
+    if count(text) <= tokens:
+        return text
+    if tokens <= count(ELLIPSIS):
+        return ""
+    # Scale by characters, then shrink until the tokenizer agrees
+    n = len(text) * tokens // max(count(text), 1)
+    while n > 0 and count(text[:n] + ELLIPSIS) > tokens:
+        n = n * 9 // 10
+    return text[:n].rstrip() + ELLIPSIS if n > 0 else ""
+
+
+def truncate(responses: list[str], tokens: int, count: Counter) -> list[str]:
+    """Shorten every response by the same fraction so the total fits."""
+    sizes = [count(x) for x in responses]
+    total = sum(sizes)
+    if total <= tokens:
+        return responses
+    out = [_cut(x, size * tokens // total, count) for x, size in zip(responses, sizes, strict=True)]
+    return [x for x in out if x]
+
+
+def drop(responses: list[str], tokens: int, count: Counter) -> list[str]:
+    """Keep responses in order until the budget runs out; the first is truncated if needed.
+
+    Put a ``Rank`` step first so the lowest-ranked responses are the ones dropped.
+    """
+    out: list[str] = []
+    for x in responses:
+        size = count(x)
+        if size > tokens:
+            break
+        out.append(x)
+        tokens -= size
+    if not out and responses:
+        first = _cut(responses[0], tokens, count)
+        return [first] if first else []
+    return out
+
+
+def dedupe(responses: list[str], tokens: int, count: Counter) -> list[str]:
+    """Drop near-identical responses (see ``Dedupe``), then ``truncate`` the rest."""
+    kept = [responses[group[0]] for group in clusters(responses, 0.9)]
+    return truncate(kept, tokens, count)
+
+
+class Budget(NamedTuple):
+    tokens: int
+    fit: Strategy = truncate
+    count: Counter = estimate
@@ -0,0 +1,131 @@
+"""Response cache for LLM calls: in-memory LRU with an optional SQLite tier."""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Any, NamedTuple
+
+DEFAULT_CACHE_SIZE = 1024
+
+
+class Entry(NamedTuple):
+    text: str
+    in_tokens: int
+    out_tokens: int
+    created: float
+
+
+def cache_key(model: str, messages: Any, temp: float, max_tokens: int, sample: int = 0) -> str:
+    """Stable hash of a call. ``sample`` separates repeated draws of one sampled call."""
+    payload = [model, messages, temp, max_tokens] + ([sample] if sample else [])
+    raw = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class Cache:
+    """LRU response cache keyed on ``(model, messages, temp, max_tokens)``.
+
+    Entries expire after ``ttl`` seconds and the memory tier evicts least
+    recently used entries beyond ``maxsize`` entries or ``max_chars`` characters
+    of response text. With ``path`` set, entries are also written to a SQLite
+    database and survive restarts. ``sampled=False`` skips calls with
+    ``temp > 0``; otherwise repeated draws of the same sampled call within a
+    step (Self-MoA) are cached separately so reruns keep their diversity.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = DEFAULT_CACHE_SIZE,
+        *,
+        ttl: float | None = None,
+        max_chars: int | None = None,
+        path: str | None = None,
+        sampled: bool = True,
+    ) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_chars = max_chars
+        self.sampled = sampled
+        self.hits = 0
+        self.misses = 0
+        self._mem: OrderedDict[str, Entry] = OrderedDict()
+        self._chars = 0
+        self._db: sqlite3.Connection | None = None
+        if path is not None:
+            self._db = sqlite3.connect(path)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, text TEXT, "
+                "in_tokens INTEGER, out_tokens INTEGER, created REAL)"
+            )
+
+    def __len__(self) -> int:
+        return len(self._mem)
+
+    def accepts(self, temp: float) -> bool:
+        return self.sampled or temp == 0
+
+    def _fresh(self, entry: Entry) -> bool:
+        return self.ttl is None or time.time() - entry.created < self.ttl
+
+    def get(self, key: str) -> Entry | None:
+        entry = self._mem.get(key)
+        if entry is not None:
+            if self._fresh(entry):
+                self._mem.move_to_end(key)
+                self.hits += 1
+                return entry
+            self._drop(key)
+        if self._db is not None:
+            row = self._db.execute(
+                "SELECT text, in_tokens, out_tokens, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None:
+                entry = Entry(*row)
+                if self._fresh(entry):
+                    self._remember(key, entry)
+                    self.hits += 1
+                    return entry
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+        self.misses += 1
+        return None
+
+    def set(self, key: str, text: str, in_tokens: int, out_tokens: int) -> None:
+        entry = Entry(text, in_tokens, out_tokens, time.time())
+        self._remember(key, entry)
+        if self._db is not None:
+            with self._db:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)", (key, *entry)
+                )
+
+    def _remember(self, key: str, entry: Entry) -> None:
+        if key in self._mem:
+            self._drop(key)
+        self._mem[key] = entry
+        self._chars += len(entry.text)
+        while self._mem and (
+            len(self._mem) > self.maxsize
+            or (self.max_chars is not None and self._chars > self.max_chars)
+        ):
+            self._drop(next(iter(self._mem)))
+
+    def _drop(self, key: str) -> None:
+        self._chars -= len(self._mem.pop(key).text)
+
+    def clear(self) -> None:
+        self._mem.clear()
+        self._chars = 0
+        if self._db is not None:
+            with self._db:
+                self._db.execute("DELETE FROM responses")
+
+    def close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
@@ -0,0 +1,67 @@
+"""Checkpoint stores: a run's history saved after each step, so it can resume."""
+
+from __future__ import annotations
+
+import json
+import os
+from typing import Any, Protocol
+from urllib.parse import quote
+
+
+class CheckpointStore(Protocol):
+    def load(self, key: str) -> list[dict[str, Any]] | None: ...
+
+    def save(self, key: str, history: list[dict[str, Any]]) -> None: ...
+
+    def delete(self, key: str) -> None: ...
+
+
+class MemoryCheckpoint:
+    """Checkpoints held in a dict; survives failed runs, not process restarts."""
+
+    def __init__(self) -> None:
+        self._runs: dict[str, str] = {}
+
+    def __len__(self) -> int:
+        return len(self._runs)
+
+    def load(self, key: str) -> list[dict[str, Any]] | None:
+        raw = self._runs.get(key)
+        return json.loads(raw) if raw is not None else None
+
+    def save(self, key: str, history: list[dict[str, Any]]) -> None:
+        self._runs[key] = json.dumps(history)
+
+    def delete(self, key: str) -> None:
+        self._runs.pop(key, None)
+
+
+class FileCheckpoint:
+    """One JSON file per run in ``path``, replaced atomically on each save."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def _file(self, key: str) -> str:
+        return os.path.join(self.path, quote(key, safe="") + ".json")
+
+    def load(self, key: str) -> list[dict[str, Any]] | None:
+        try:
+            with open(self._file(key), encoding="utf-8") as f:
+                history: list[dict[str, Any]] = json.load(f)
+        except FileNotFoundError:
+            return None
+        return history
+
+    def save(self, key: str, history: list[dict[str, Any]]) -> None:
+        file = self._file(key)
+        with open(file + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(history, f, ensure_ascii=False)
+        os.replace(file + ".tmp", file)
+
+    def delete(self, key: str) -> None:
+        try:
+            os.remove(self._file(key))
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,173 @@
+"""Pooled clients for OpenAI-compatible chat completion endpoints.
+
+Requires ``httpx`` (``pip install mixture-llm[http]``).
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from collections.abc import AsyncIterator
+from types import TracebackType
+from typing import Any
+
+try:
+    import httpx
+except ImportError as e:  # pragma: no cover
+    raise ImportError("mixture_llm.clients requires httpx: pip install 'mixture-llm[http]'") from e
+
+from .core import DEFAULT_CONCURRENCY, Message, Usage
+
+
+class APIError(Exception):
+    def __init__(self, status_code: int, message: str):
+        super().__init__(f"Error code: {status_code} - {message}")
+        self.status_code = status_code
+
+
+# One connection pool per (base URL, HTTP/2) shared by every client pointing at it
+_pools: dict[tuple[str, bool], tuple[httpx.AsyncClient, int]] = {}
+
+
+def _acquire(key: tuple[str, bool], concurrency: int, timeout: float) -> httpx.AsyncClient:
+    if key in _pools:
+        http, refs = _pools[key]
+    else:
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        http, refs = httpx.AsyncClient(http2=key[1], limits=limits, timeout=timeout), 0
+    _pools[key] = http, refs + 1
+    return http
+
+
+async def _release(key: tuple[str, bool]) -> None:
+    http, refs = _pools[key]
+    if refs > 1:
+        _pools[key] = http, refs - 1
+    else:
+        del _pools[key]
+        await http.aclose()
+
+
+def _cached(usage: dict[str, Any]) -> int:
+    # OpenAI-style prompt_tokens_details, or Anthropic-style cache_read_input_tokens
+    details = usage.get("prompt_tokens_details") or {}
+    return int(details.get("cached_tokens") or usage.get("cache_read_input_tokens") or 0)
+
+
+class OpenAICompatible:
+    """``Client``/``StreamingClient`` for ``/chat/completions`` endpoints.
+
+    Clients with the same ``base_url`` share one keep-alive connection pool
+    (HTTP/2 when the server negotiates it), sized by the first client's
+    ``concurrency``; match it to the ``Scheduler``'s. The pool closes when
+    the last client sharing it is closed with ``aclose()``.
+
+    Messages marked ``cache`` (``run(..., prefix_cache=True)``) are sent as
+    plain messages, which suits providers that cache prefixes automatically;
+    with ``cache_control=True`` they carry an ephemeral ``cache_control``
+    breakpoint instead, for endpoints that need explicit markers.
+    """
+
+    def __init__(
+        self,
+        base_url: str = "https://api.openai.com/v1",
+        api_key: str | None = None,
+        *,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        http2: bool = True,
+        timeout: float = 600.0,
+        headers: dict[str, str] | None = None,
+        cache_control: bool = False,
+    ) -> None:
+        self.base_url = base_url.rstrip("/")
+        key = api_key if api_key is not None else os.environ.get("OPENAI_API_KEY")
+        self.headers = {**({"Authorization": f"Bearer {key}"} if key else {}), **(headers or {})}
+        self.cache_control = cache_control
+        self._key = (self.base_url, http2)
+        self._http: httpx.AsyncClient | None = _acquire(self._key, concurrency, timeout)
+
+    def payload(
+        self, model: str, messages: list[Message], temp: float, max_tokens: int
+    ) -> dict[str, Any]:
+        """Request body; override for provider quirks (e.g. ``max_completion_tokens``)."""
+        return {
+            "model": model,
+            "messages": [self._wire(m) for m in messages],
+            "temperature": temp,
+            "max_tokens": max_tokens,
+        }
+
+    def _wire(self, m: Message) -> dict[str, Any]:
+        if not (self.cache_control and m.get("cache")):
+            return {"role": m["role"], "content": m["content"]}
+        block = {"type": "text", "text": m["content"], "cache_control": {"type": "ephemeral"}}
+        return {"role": m["role"], "content": [block]}
+
+    @property
+    def http(self) -> httpx.AsyncClient:
+        if self._http is None:
+            raise RuntimeError("client is closed")
+        return self._http
+
+    async def __call__(
+        self, *, model: str, messages: list[Message], temp: float, max_tokens: int
+    ) -> Usage:
+        resp = await self.http.post(
+            f"{self.base_url}/chat/completions",
+            json=self.payload(model, messages, temp, max_tokens),
+            headers=self.headers,
+        )
+        if resp.status_code >= 400:
+            raise APIError(resp.status_code, resp.text)
+        data = resp.json()
+        usage = data.get("usage") or {}
+        return (
+            data["choices"][0]["message"]["content"] or "",
+            usage.get("prompt_tokens", 0),
+            usage.get("completion_tokens", 0),
+            _cached(usage),
+        )
+
+    async def stream(
+        self, *, model: str, messages: list[Message], temp: float, max_tokens: int
+    ) -> AsyncIterator[Usage]:
+        body = {
+            **self.payload(model, messages, temp, max_tokens),
+            "stream": True,
+            "stream_options": {"include_usage": True},
+        }
+        async with self.http.stream(
+            "POST", f"{self.base_url}/chat/completions", json=body, headers=self.headers
+        ) as resp:
+            if resp.status_code >= 400:
+                raise APIError(resp.status_code, (await resp.aread()).decode())
+            async for line in resp.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    # Read to the end so the connection goes back to the pool
+                    continue
+                chunk = json.loads(data)
+                usage = chunk.get("usage") or {}
+                delta = "".join(
+                    (c.get("delta") or {}).get("content") or "" for c in chunk.get("choices") or []
+                )
+                in_tok, out_tok = usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+                yield delta, in_tok, out_tok, _cached(usage)
+
+    async def aclose(self) -> None:
+        if self._http is not None:
+            self._http = None
+            await _release(self._key)
+
+    async def __aenter__(self) -> OpenAICompatible:
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        tb: TracebackType | None,
+    ) -> None:
+        await self.aclose()
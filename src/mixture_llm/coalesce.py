@@ -0,0 +1,68 @@
+"""Single-flight coalescing: concurrent identical LLM calls share one request."""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+Outcome = tuple[str | None, dict[str, Any], Exception | None]
+
+
+class _Flight:
+    def __init__(self, task: asyncio.Future[Outcome]) -> None:
+        self.task = task
+        self.joined = 0
+        self.waiting = 0
+
+
+class SingleFlight:
+    """Lets concurrent calls with the same cache key share one in-flight request.
+
+    Only ``temp == 0`` calls are shared unless ``sampled=True``. Nothing is
+    kept once a call finishes; pair with ``Cache`` for that. The first
+    caller's ``llm_calls`` entry gets ``fanout``, the number of callers that
+    shared it. The others are recorded with ``coalesced: True``. The request
+    is cancelled only when every caller waiting on it has been cancelled.
+    """
+
+    def __init__(self, *, sampled: bool = False) -> None:
+        self.sampled = sampled
+        self.shared = 0  # Calls answered by another caller's request
+        self._flights: dict[str, _Flight] = {}
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    def accepts(self, temp: float) -> bool:
+        return self.sampled or temp == 0
+
+    async def share(self, key: str, call: Callable[[], Awaitable[Outcome]]) -> Outcome:
+        flight = self._flights.get(key)
+        first = flight is None
+        if flight is None:
+            flight = self._flights[key] = _Flight(asyncio.ensure_future(call()))
+            flight.task.add_done_callback(lambda _: self._forget(key, flight))
+        else:
+            self.shared += 1
+        flight.joined += 1
+        flight.waiting += 1
+        t0 = time.time()
+        try:
+            text, info, error = await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            if not flight.task.done():
+                flight.waiting -= 1
+                if not flight.waiting:
+                    flight.task.cancel()
+            raise
+        if first:
+            return text, {**info, "fanout": flight.joined} if flight.joined > 1 else info, error
+        keys = ("model", "in_tokens", "out_tokens", "cached_tokens", "error", "cancelled")
+        shared: dict[str, Any] = {k: info[k] for k in keys if k in info}
+        return text, {**shared, "time": time.time() - t0, "coalesced": True}, error
+
+    def _forget(self, key: str, flight: _Flight) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
@@ -1,17 +1,50 @@
 import asyncio
+import hashlib
+import inspect
 import random
 import re
 import time
-from collections.abc import Awaitable, Callable
+import uuid
+from collections.abc import (
+    AsyncIterable,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Iterable,
+    Sequence,
+)
+from concurrent.futures import Executor, ProcessPoolExecutor
 from itertools import cycle
-from typing import Any, NamedTuple, Protocol, TypedDict
+from typing import Any, Literal, NamedTuple, Protocol, TypedDict, TypeVar
+
+from .budget import Budget
+from .cache import Cache, cache_key
+from .checkpoint import CheckpointStore
+from .coalesce import SingleFlight
+from .history import Detail, History
+from .hooks import Hooks
+from .retry import Retry
+from .router import Router
+from .scheduler import Scheduler
+from .similarity import clusters, similarity, sketch
+
+T = TypeVar("T")
 
 
-class Message(TypedDict):
+class _Message(TypedDict):
     role: str
     content: str
 
 
+class Message(_Message, total=False):
+    cache: bool  # Set with prefix_cache=True: the prompt up to here is shared, cache it
+
+
+# (text, in_tokens, out_tokens) or, when the provider reports it,
+# (text, in_tokens, out_tokens, cached_in_tokens)
+Usage = tuple[str, int, int] | tuple[str, int, int, int]
+
+
 class Client(Protocol):
     def __call__(
         self,
@@ -20,11 +53,23 @@ class Client(Protocol):
         messages: list[Message],
         temp: float,
         max_tokens: int,
-    ) -> Awaitable[tuple[str, int, int]]: ...
+    ) -> Awaitable[Usage]: ...
+
+
+class StreamingClient(Client, Protocol):
+    def stream(
+        self,
+        *,
+        model: str,
+        messages: list[Message],
+        temp: float,
+        max_tokens: int,
+    ) -> AsyncIterator[Usage]: ...
 
 
 DEFAULT_TEMP = 0.7
 DEFAULT_MAX_TOKENS = 2048
+DEFAULT_CONCURRENCY = 16
 P_SYNTH = (
     "You have been provided with responses from various models to a query. "
     "Synthesize into a single, high-quality response. "
@@ -52,6 +97,9 @@ class Propose(NamedTuple):
     agents: list[str]
     temp: float = DEFAULT_TEMP
     max_tokens: int = DEFAULT_MAX_TOKENS
+    quorum: int | None = None
+    timeout: float | None = None
+    deadline: float | None = None
 
 
 class Synthesize(NamedTuple):
@@ -59,6 +107,12 @@ class Synthesize(NamedTuple):
     prompt: str = P_SYNTH
     temp: float = DEFAULT_TEMP
     max_tokens: int = DEFAULT_MAX_TOKENS
+    quorum: int | None = None
+    timeout: float | None = None
+    deadline: float | None = None
+    start_after: int | None = None
+    start_by: float | None = None
+    budget: Budget | None = None
 
 
 class Aggregate(NamedTuple):
@@ -66,6 +120,7 @@ class Aggregate(NamedTuple):
     prompt: str = P_SYNTH
     temp: float = DEFAULT_TEMP
     max_tokens: int = DEFAULT_MAX_TOKENS
+    budget: Budget | None = None
 
 
 class Refine(NamedTuple):
@@ -76,18 +131,21 @@ class Refine(NamedTuple):
 
 
 class Rank(NamedTuple):
-    agent: str
+    agent: str | None
     n: int = 3
     prompt: str = P_RANK
     temp: float = DEFAULT_TEMP
     max_tokens: int = DEFAULT_MAX_TOKENS
+    normalize: Callable[[str], str] | None = None
 
 
 class Vote(NamedTuple):
-    agent: str
+    agent: str | None
     prompt: str = P_VOTE
     temp: float = DEFAULT_TEMP
     max_tokens: int = DEFAULT_MAX_TOKENS
+    budget: Budget | None = None
+    normalize: Callable[[str], str] | None = None
 
 
 class Shuffle(NamedTuple): ...
@@ -105,54 +163,609 @@ class Take(NamedTuple):
     n: int
 
 
+class Dedupe(NamedTuple):
+    threshold: float = 0.9
+
+
+# Where Map/Filter functions run: in the event loop, the loop's thread pool,
+# a shared process pool, or a given executor
+Offload = Literal["inline", "thread", "process"] | Executor
+
+
 class Filter(NamedTuple):
-    fn: Callable[[str], bool]
+    fn: Callable[[str], bool] | Callable[[str], Awaitable[bool]]
+    # Checked on the text generated so far by streamed calls of the step before; False cancels
+    partial: Callable[[str], bool] | None = None
+    executor: Offload | None = None
 
 
 class Map(NamedTuple):
-    fn: Callable[[str], str]
+    fn: Callable[[str], str] | Callable[[str], Awaitable[str]]
+    executor: Offload | None = None
+
+
+class Route(NamedTuple):
+    step: Propose | Synthesize
+    router: Router
+    n: int | None = None
+
+
+class Gate(NamedTuple):
+    predicate: Callable[[list[str]], bool]
+    then: Sequence[Any] = ()
+
+
+class StepStart(NamedTuple):
+    pos: int
+    step: Any
+
+
+class CallEnd(NamedTuple):
+    pos: int
+    info: dict[str, Any]
+
+
+class Token(NamedTuple):
+    pos: int
+    model: str
+    text: str
+
+
+class StepEnd(NamedTuple):
+    pos: int
+    record: dict[str, Any]
+
+
+class Done(NamedTuple):
+    result: str
+    history: History
+
+
+Event = StepStart | CallEnd | Token | StepEnd | Done
+
+
+class _Run(NamedTuple):
+    client: Client
+    scheduler: Scheduler | None = None
+    run_id: str = ""
+    cache: Cache | None = None
+    emit: Callable[[Event], None] | None = None
+    pos: int = 0
+    retry: Retry | None = None
+    hooks: Sequence[Hooks] = ()
+    checkpoint: CheckpointStore | None = None
+    coalesce: SingleFlight | None = None
+    detail: Detail = "full"
+    prefix_cache: bool = False
+    watch: Callable[[str], bool] | None = None
+    seed: int = 0
+    executor: Offload = "inline"
+
+
+class _Rejected(Exception):
+    """A streamed response failed the next Filter's ``partial`` check."""
 
+    def __init__(self, text: str) -> None:
+        self.text = text
 
-def _enumerate(responses: list[str]) -> str:
-    return "\n\n".join(f"{i + 1}. {x}" for i, x in enumerate(responses))
 
+def _enumerate(responses: list[str], weights: dict[str, int] | None = None) -> str:
+    if not weights:
+        return "\n\n".join(f"{i + 1}. {x}" for i, x in enumerate(responses))
+    return "\n\n".join(
+        f"{i + 1}. {x}"
+        + (f"\n({n} near-identical responses)" if (n := weights.get(x, 1)) > 1 else "")
+        for i, x in enumerate(responses)
+    )
 
-def _msgs(prompt: str, outs: list[str], query: str) -> list[Message]:
+
+def _msgs(
+    prompt: str,
+    outs: list[str],
+    query: str,
+    budget: Budget | None = None,
+    weights: dict[str, int] | None = None,
+    prefix: bool = False,
+) -> list[Message]:
+    if budget is not None and outs:
+        fixed = sum(budget.count(m["content"]) for m in _msgs(prompt, [], query))
+        # Leave room for the "N. " numbering between responses
+        outs = budget.fit(outs, max(budget.tokens - fixed - 2 * len(outs), 0), budget.count)
+    if prefix:
+        # Sorted after fitting, so the budget still drops the lowest-ranked responses, and in
+        # the same order whatever the arrival order or Shuffle, so reruns reuse the cache too
+        outs = sorted(outs)
+        # Query ahead of the responses: prompt + query is shared by every call of the run,
+        # the whole prompt by every agent of a layer
+        return [
+            {"role": "system", "content": f"{prompt}\n\nQuery: {query}", "cache": True},
+            {"role": "user", "content": f"Responses:\n{_enumerate(outs, weights)}", "cache": True},
+        ]
     return [
         {"role": "system", "content": prompt},
-        {"role": "user", "content": f"Responses:\n{_enumerate(outs)}\n\nQuery: {query}"},
+        {"role": "user", "content": f"Responses:\n{_enumerate(outs, weights)}\n\nQuery: {query}"},
     ]
 
 
-async def _call(
-    model: str, messages: list[Message], temp: float, max_tokens: int, client: Client
-) -> tuple[str | None, dict[str, Any]]:
+def _estimate(messages: list[Message]) -> int:
+    return sum(len(m["content"]) for m in messages) // 4
+
+
+async def _invoke(
+    model: str,
+    messages: list[Message],
+    temp: float,
+    max_tokens: int,
+    ctx: _Run,
+    stream: bool,
+    info: dict[str, Any],
+) -> tuple[str, int, int, int]:
+    chunks = getattr(ctx.client, "stream", None)
+    if chunks is None:
+        out = await ctx.client(model=model, messages=messages, temp=temp, max_tokens=max_tokens)
+        return out if len(out) == 4 else (*out, 0)
+    emit = ctx.emit if stream else None
+    watch = ctx.watch
     t0 = time.time()
+    text = ""
+    in_tok = out_tok = cached = 0
+    it = chunks(model=model, messages=messages, temp=temp, max_tokens=max_tokens)
+    try:
+        async for chunk in it:
+            delta, i, o = chunk[:3]
+            if delta:
+                if not text:
+                    info["ttft"] = time.time() - t0
+                text += delta
+                if emit:
+                    emit(Token(ctx.pos, model, delta))
+                if watch is not None and not watch(text):
+                    raise _Rejected(text)
+            in_tok += i
+            out_tok += o
+            cached += chunk[3] if len(chunk) == 4 else 0
+    finally:
+        # Closes the provider stream when cancelled or rejected mid-generation
+        if (close := getattr(it, "aclose", None)) is not None:
+            await close()
+    return text, in_tok, out_tok, cached
+
+
+async def _within(aw: Awaitable[T], timeout: float | None) -> T | None:
+    if timeout is None:
+        return await aw
+    task = asyncio.ensure_future(aw)
     try:
-        text, in_tok, out_tok = await client(
-            model=model, messages=messages, temp=temp, max_tokens=max_tokens
+        done, _ = await asyncio.wait((task,), timeout=timeout)
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
+    if done:
+        return task.result()
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    return None
+
+
+def _emit_calls(ctx: _Run, infos: list[dict[str, Any]]) -> None:
+    for info in infos:
+        if ctx.emit:
+            ctx.emit(CallEnd(ctx.pos, info))
+        for h in ctx.hooks:
+            if "error" in info:
+                h.on_call_error(ctx.run_id, ctx.pos, info)
+            else:
+                h.on_call_end(ctx.run_id, ctx.pos, info)
+
+
+def _step_started(ctx: _Run, pos: int, step: Any) -> None:
+    if ctx.emit:
+        ctx.emit(StepStart(pos, step))
+    for h in ctx.hooks:
+        h.on_step_start(ctx.run_id, pos, step)
+
+
+def _step_ended(ctx: _Run, pos: int, record: dict[str, Any]) -> None:
+    if ctx.emit:
+        ctx.emit(StepEnd(pos, record))
+    for h in ctx.hooks:
+        h.on_step_end(ctx.run_id, pos, record)
+
+
+async def _call(
+    model: str,
+    messages: list[Message],
+    temp: float,
+    max_tokens: int,
+    ctx: _Run,
+    *,
+    sample: int = 0,
+    stream: bool = False,
+    timeout: float | None = None,
+    log: list[dict[str, Any]] | None = None,
+) -> tuple[str | None, list[dict[str, Any]]]:
+    infos = [] if log is None else log
+    policy = ctx.retry
+    if policy is None:
+        text, info, _ = await _attempt(
+            model, messages, temp, max_tokens, ctx, sample, stream, timeout
         )
-        return text, {
-            "model": model,
-            "time": time.time() - t0,
-            "in_tokens": in_tok,
-            "out_tokens": out_tok,
-        }
+        infos.append(info)
+        _emit_calls(ctx, [info])
+        return text, infos
+    for m in policy.chain(model):
+        for n in range(policy.attempts):
+            if n:
+                await asyncio.sleep(policy.delay(n - 1))
+            text, tried, error = await _hedged(
+                policy, m, messages, temp, max_tokens, ctx, sample, stream, timeout
+            )
+            for info in tried:
+                info["attempt"] = len(infos) + 1
+                infos.append(info)
+            _emit_calls(ctx, tried)
+            if text or any(info.get("cancelled") == "filter" for info in tried):
+                return text, infos
+            if error is not None and not policy.retry_on(error):
+                break
+    return None, infos
+
+
+async def _hedged(
+    policy: Retry,
+    model: str,
+    messages: list[Message],
+    temp: float,
+    max_tokens: int,
+    ctx: _Run,
+    sample: int,
+    stream: bool,
+    timeout: float | None,
+) -> tuple[str | None, list[dict[str, Any]], BaseException | None]:
+    args = (model, messages, temp, max_tokens, ctx, sample, stream, timeout)
+    # Hedging a call that emits Token events would interleave two answers' tokens
+    emits = stream and ctx.emit is not None and hasattr(ctx.client, "stream")
+    wait = None if emits else policy.hedge_delay(model)
+    if wait is None:
+        text, info, error = await _attempt(*args)
+        if text and not info.get("cached"):
+            policy.observe(model, info["time"])
+        return text, [info], error
+
+    starts = [time.time()]
+    tasks = [asyncio.ensure_future(_attempt(*args))]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=wait)
+        if not done:
+            starts.append(time.time())
+            # A fresh request: sharing would just wait on the slow one again
+            tasks.append(asyncio.ensure_future(_attempt(*args, share=False)))
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                if any(t.result()[0] for t in done):
+                    break
+    finally:
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    text, error = None, None
+    infos: list[dict[str, Any]] = []
+    for t, t0 in zip(tasks, starts, strict=True):
+        if t.cancelled():
+            info = {
+                "model": model,
+                "time": time.time() - t0,
+                "in_tokens": 0,
+                "out_tokens": 0,
+                "cancelled": "hedge",
+            }
+        else:
+            out, info, err = t.result()
+            if out and not text:
+                text = out
+                if not info.get("cached"):
+                    policy.observe(model, info["time"])
+            error = error or err
+        if t is not tasks[0]:
+            info["hedge"] = True
+        infos.append(info)
+    return text, infos, error
+
+
+async def _attempt(
+    model: str,
+    messages: list[Message],
+    temp: float,
+    max_tokens: int,
+    ctx: _Run,
+    sample: int,
+    stream: bool,
+    timeout: float | None,
+    *,
+    share: bool = True,
+) -> tuple[str | None, dict[str, Any], Exception | None]:
+    key = None
+    if ctx.cache is not None and ctx.cache.accepts(temp):
+        key = cache_key(model, messages, temp, max_tokens, sample if temp else 0)
+        if hit := ctx.cache.get(key):
+            return (
+                hit.text,
+                {
+                    "model": model,
+                    "time": 0.0,
+                    "in_tokens": hit.in_tokens,
+                    "out_tokens": hit.out_tokens,
+                    "cached": True,
+                },
+                None,
+            )
+    flights = ctx.coalesce
+    # A Filter's partial check or Token events belong to this run alone, so don't share
+    private = ctx.watch is not None or (stream and ctx.emit is not None)
+    if flights is None or not share or private or not flights.accepts(temp):
+        return await _fetch(model, messages, temp, max_tokens, ctx, stream, timeout, key)
+    return await flights.share(
+        key or cache_key(model, messages, temp, max_tokens, sample if temp else 0),
+        lambda: _fetch(model, messages, temp, max_tokens, ctx, stream, timeout, key),
+    )
+
+
+async def _fetch(
+    model: str,
+    messages: list[Message],
+    temp: float,
+    max_tokens: int,
+    ctx: _Run,
+    stream: bool,
+    timeout: float | None,
+    key: str | None,
+) -> tuple[str | None, dict[str, Any], Exception | None]:
+    for h in ctx.hooks:
+        h.on_call_start(ctx.run_id, ctx.pos, model)
+    sched = ctx.scheduler
+    ticket = None
+    info: dict[str, Any] = {"model": model}
+    t0 = time.time()
+    try:
+        if sched:
+            ticket = await sched.acquire(model, _estimate(messages) + max_tokens, ctx.run_id)
+            info.update(queue_wait=ticket.wait, queue_depth=ticket.depth)
+            t0 = time.time()
+        out = await _within(_invoke(model, messages, temp, max_tokens, ctx, stream, info), timeout)
+    except _Rejected as e:
+        # Usage only arrives with the last chunk, so bill what was generated by estimate
+        in_tok, out_tok = _estimate(messages), len(e.text) // 4
+        if sched and ticket:
+            sched.release(ticket, in_tok + out_tok)
+        info.update(time=time.time() - t0, in_tokens=in_tok, out_tokens=out_tok, cancelled="filter")
+        return None, info, None
     except Exception as e:
-        return None, {
-            "model": model,
-            "time": time.time() - t0,
-            "in_tokens": 0,
-            "out_tokens": 0,
-            "error": repr(e),
-        }
+        if sched and ticket:
+            sched.release(ticket, error=e)
+        info.update(time=time.time() - t0, in_tokens=0, out_tokens=0, error=repr(e))
+        return None, info, e
+    except BaseException:
+        if sched and ticket:
+            sched.release(ticket)
+        raise
+    if sched and ticket:
+        sched.release(ticket, out and out[1] + out[2])
+    if out is None:
+        info.update(time=time.time() - t0, in_tokens=0, out_tokens=0, cancelled="timeout")
+        return None, info, None
+    text, in_tok, out_tok, cached = out
+    if key and ctx.cache is not None and text:
+        ctx.cache.set(key, text, in_tok, out_tok)
+    info.update(time=time.time() - t0, in_tokens=in_tok, out_tokens=out_tok)
+    if "ttft" in info and out_tok:
+        info["tokens_per_sec"] = out_tok / max(info["time"] - info["ttft"], 1e-6)
+    if cached:
+        info["cached_tokens"] = cached
+    return text, info, None
+
+
+def _samples(models: list[str]) -> list[int]:
+    """Occurrence number of each model, so repeated draws get distinct cache keys."""
+    seen: dict[str, int] = {}
+    out = []
+    for m in models:
+        seen[m] = seen.get(m, -1) + 1
+        out.append(seen[m])
+    return out
 
 
 async def _many(
-    models: list[str], messages: list[Message], temp: float, max_tokens: int, client: Client
+    models: list[str],
+    messages: list[Message],
+    temp: float,
+    max_tokens: int,
+    ctx: _Run,
+    *,
+    quorum: int | None = None,
+    timeout: float | None = None,
+    deadline: float | None = None,
+) -> tuple[list[str], list[dict[str, Any]]]:
+    logs: list[list[dict[str, Any]]] = [[] for _ in models]
+    calls = [
+        _call(m, messages, temp, max_tokens, ctx, sample=k, timeout=timeout, log=log)
+        for m, k, log in zip(models, _samples(models), logs, strict=True)
+    ]
+    return await _gather(models, calls, logs, ctx, quorum, deadline)
+
+
+async def _gather(
+    models: list[str],
+    calls: Sequence[Awaitable[tuple[str | None, list[dict[str, Any]]]]],
+    logs: list[list[dict[str, Any]]],
+    ctx: _Run,
+    quorum: int | None,
+    deadline: float | None,
 ) -> tuple[list[str], list[dict[str, Any]]]:
-    res = await asyncio.gather(*(_call(m, messages, temp, max_tokens, client) for m in models))
-    return [t for (t, _) in res if t], [info for (_, info) in res]
+    if quorum is None and deadline is None:
+        res = await asyncio.gather(*calls)
+        return [t for (t, _) in res if t], [info for log in logs for info in log]
+
+    t0 = time.time()
+    tasks = [asyncio.ensure_future(c) for c in calls]
+    pending = set(tasks)
+    ok, reason = 0, "deadline"
+    try:
+        while pending:
+            left = None if deadline is None else t0 + deadline - time.time()
+            done, pending = await asyncio.wait(
+                pending, timeout=left, return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:
+                break
+            ok += sum(1 for t in done if t.result()[0])
+            if quorum is not None and ok >= quorum:
+                reason = "quorum"
+                break
+    finally:
+        for t in pending:
+            t.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    responses: list[str] = []
+    infos: list[dict[str, Any]] = []
+    for m, t, log in zip(models, tasks, logs, strict=True):
+        infos.extend(log)
+        if t in pending:
+            info = {
+                "model": m,
+                "time": time.time() - t0,
+                "in_tokens": 0,
+                "out_tokens": 0,
+                "cancelled": reason,
+            }
+            _emit_calls(ctx, [info])
+            infos.append(info)
+        elif text := t.result()[0]:
+            responses.append(text)
+    return responses, infos
+
+
+class _Feed:
+    """Responses of a layer in arrival order, for an overlapping layer downstream."""
+
+    __slots__ = ("items", "done", "t0", "_changed")
+
+    def __init__(self) -> None:
+        self.items: list[str] = []
+        self.done = False
+        self.t0 = time.time()
+        self._changed = asyncio.Event()
+
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def put(self, text: str) -> None:
+        self.items.append(text)
+        self._notify()
+
+    def close(self) -> None:
+        self.done = True
+        self._notify()
+
+    async def wait(self, n: int, by: float | None) -> list[str]:
+        """Wait for ``n`` items, or for any item once ``by`` seconds have passed."""
+        until = None if by is None else self.t0 + by
+        while not self.done and len(self.items) < n:
+            left = None if until is None else until - time.time()
+            if left is not None and left <= 0:
+                if self.items:
+                    break
+                left = None
+            try:
+                await asyncio.wait_for(self._changed.wait(), left)
+            except asyncio.TimeoutError:
+                pass
+        return self.items.copy()
+
+
+def _overlaps(step: Any) -> bool:
+    return isinstance(step, Synthesize) and (
+        step.start_after is not None or step.start_by is not None
+    )
+
+
+async def _pipelined(
+    layers: list[Any],
+    responses: list[str],
+    query: str,
+    ctx: _Run,
+    history: History | list[dict[str, Any]],
+    base: int,
+) -> list[str]:
+    """Run consecutive Propose/Synthesize layers, each starting on partial upstream output."""
+    base += len(history)
+    last = len(layers) - 1
+    feeds = [_Feed() for _ in layers]
+    records: list[dict[str, Any] | None] = [None] * len(layers)
+    # Latest layer end so far; each layer's step_time is what it adds past it, so the
+    # step times of a group sum to its wall time
+    frontier = feeds[0].t0
+
+    async def agent(
+        i: int, m: str, k: int, log: list[dict[str, Any]]
+    ) -> tuple[str | None, list[dict[str, Any]]]:
+        step = layers[i]
+        lctx = ctx._replace(pos=base + i, watch=ctx.watch if i == last else None)
+        saw = None
+        if isinstance(step, Propose):
+            msgs: list[Message] = [{"role": "user", "content": query}]
+        elif i == 0:
+            if not responses:
+                return None, log
+            msgs = _msgs(step.prompt, responses, query, step.budget, prefix=ctx.prefix_cache)
+        else:
+            need = step.start_after or len(layers[i - 1].agents)
+            seen = await feeds[i - 1].wait(need, step.start_by)
+            if not seen:
+                return None, log
+            saw = list(range(len(seen)))
+            msgs = _msgs(step.prompt, seen, query, step.budget, prefix=ctx.prefix_cache)
+        text, infos = await _call(
+            m, msgs, step.temp, step.max_tokens, lctx, sample=k, timeout=step.timeout, log=log
+        )
+        if saw is not None:
+            for info in infos:
+                info["saw"] = saw
+        if text:
+            feeds[i].put(text)
+        return text, infos
+
+    async def layer(i: int) -> None:
+        step = layers[i]
+        lctx = ctx._replace(pos=base + i)
+        logs: list[list[dict[str, Any]]] = [[] for _ in step.agents]
+        calls = [
+            agent(i, m, k, log)
+            for m, k, log in zip(step.agents, _samples(step.agents), logs, strict=True)
+        ]
+        try:
+            _, infos = await _gather(step.agents, calls, logs, lctx, step.quorum, step.deadline)
+        finally:
+            feeds[i].close()
+        nonlocal frontier
+        end = time.time()
+        records[i] = record = {
+            "step": type(step).__name__,
+            "outputs": feeds[i].items.copy(),
+            "llm_calls": infos,
+            "step_time": max(end - frontier, 0.0),
+        }
+        frontier = max(frontier, end)
+        _step_ended(ctx, base + i, record)
+
+    for i, step in enumerate(layers):
+        _step_started(ctx, base + i, step)
+    await asyncio.gather(*(layer(i) for i in range(len(layers))))
+    history.extend(r for r in records if r is not None)
+    return feeds[-1].items.copy()
 
 
 def _rank(text: str, *, max_len: int, n: int) -> list[int]:
@@ -166,101 +779,469 @@ def _rank(text: str, *, max_len: int, n: int) -> list[int]:
     return out
 
 
-# TODO: pipeline type annotation
-async def run(pipeline: list[Any], query: str, client: Client) -> tuple[str, list[dict[str, Any]]]:
-    responses: list[str] = []
-    history: list[dict[str, Any]] = []
+def _tally(
+    responses: list[str], normalize: Callable[[str], str] | None, weights: dict[str, int] | None
+) -> list[tuple[int, str]]:
+    """``(votes, representative)`` per normalized answer, most votes first.
+
+    Ties, and the choice of representative, go to the response lexically
+    closest to all the others.
+    """
+    sketches = [sketch(x) for x in responses]
+    central = [sum(similarity(a, b) for b in sketches) for a in sketches]
+    groups: dict[str, list[int]] = {}
+    for i, x in enumerate(responses):
+        groups.setdefault(normalize(x) if normalize else x.strip(), []).append(i)
+    ranked = []
+    for idx in groups.values():
+        best = max(idx, key=central.__getitem__)
+        votes = sum((weights or {}).get(responses[i], 1) for i in idx)
+        ranked.append((votes, central[best], -best))
+    ranked.sort(reverse=True)
+    return [(votes, responses[-neg]) for votes, _, neg in ranked]
+
+
+_processes: ProcessPoolExecutor | None = None
+
+
+def _timed(fn: Callable[[str], Any], x: str) -> tuple[Any, float]:
+    t0 = time.perf_counter()
+    return fn(x), time.perf_counter() - t0
+
+
+async def _apply(
+    fn: Callable[[str], Any], items: list[str], executor: Offload
+) -> tuple[list[Any], list[float]]:
+    """``fn`` over ``items``, in parallel unless inline, with each item's time in seconds."""
+    global _processes
+    if inspect.iscoroutinefunction(fn) or inspect.iscoroutinefunction(type(fn).__call__):
+
+        async def one(x: str) -> tuple[Any, float]:
+            t0 = time.perf_counter()
+            return await fn(x), time.perf_counter() - t0
+
+        res = await asyncio.gather(*(one(x) for x in items))
+    elif executor == "inline":
+        res = [_timed(fn, x) for x in items]
+    else:
+        pool: Executor | None = None  # The loop's default thread pool
+        if executor == "process":
+            if _processes is None:
+                _processes = ProcessPoolExecutor()
+            pool = _processes
+        elif isinstance(executor, Executor):
+            pool = executor
+        loop = asyncio.get_running_loop()
+        res = await asyncio.gather(*(loop.run_in_executor(pool, _timed, fn, x) for x in items))
+    return [y for y, _ in res], [t for _, t in res]
+
+
+def _rng(ctx: _Run) -> random.Random:
+    # One stream per step position, so concurrent graph nodes and Gate branches stay reproducible
+    return random.Random(f"{ctx.seed}:{ctx.pos}")
+
+
+Seed = int | Literal["query"] | None
+
+
+def _seed(seed: Seed, query: str) -> int:
+    if seed == "query":
+        return int.from_bytes(hashlib.sha256(query.encode()).digest()[:8], "big")
+    return random.getrandbits(64) if seed is None else seed
+
+
+def _majority(tally: list[tuple[int, str]]) -> bool:
+    """Whether the top answer has more than half of the (weighted) votes."""
+    return bool(tally) and tally[0][0] * 2 > sum(v for v, _ in tally)
+
 
-    for step in pipeline:
-        t0 = time.time()
-        calls: list[dict[str, Any]] = []
+async def _step(
+    step: Any, responses: list[str], query: str, ctx: _Run, weights: dict[str, int] | None = None
+) -> tuple[list[str], list[dict[str, Any]], dict[str, Any]]:
+    calls: list[dict[str, Any]] = []
+    extra: dict[str, Any] = {}
+    match step:
+        case Propose(agents, temp, max_tokens, quorum, timeout, deadline):
+            responses, calls = await _many(
+                agents,
+                [{"role": "user", "content": query}],
+                temp,
+                max_tokens,
+                ctx,
+                quorum=quorum,
+                timeout=timeout,
+                deadline=deadline,
+            )
 
-        match step:
-            case Propose(agents, temp, max_tokens):
+        case Synthesize(agents, prompt, temp, max_tokens, quorum, timeout, deadline, _, _, budget):
+            if responses:
                 responses, calls = await _many(
-                    agents, [{"role": "user", "content": query}], temp, max_tokens, client
+                    agents,
+                    _msgs(prompt, responses, query, budget, prefix=ctx.prefix_cache),
+                    temp,
+                    max_tokens,
+                    ctx,
+                    quorum=quorum,
+                    timeout=timeout,
+                    deadline=deadline,
                 )
 
-            case Synthesize(agents, prompt, temp, max_tokens):
-                if responses:
-                    responses, calls = await _many(
-                        agents, _msgs(prompt, responses, query), temp, max_tokens, client
-                    )
-
-            case Aggregate(agent, prompt, temp, max_tokens):
-                if responses:
-                    text, info = await _call(
-                        agent, _msgs(prompt, responses, query), temp, max_tokens, client
-                    )
-                    calls = [info]
-                    if text:
-                        responses = [text]
+        case Aggregate(agent, prompt, temp, max_tokens, budget):
+            if responses:
+                m = _msgs(prompt, responses, query, budget, prefix=ctx.prefix_cache)
+                text, infos = await _call(agent, m, temp, max_tokens, ctx, stream=True)
+                calls = infos
+                if text:
+                    responses = [text]
 
-            case Refine(agents, prompt, temp, max_tokens):
-                if responses:
-                    msgs: list[list[Message]] = [
-                        [{"role": "user", "content": prompt.format(text=o, query=query)}]
-                        for o in responses
-                    ]
-                    res = await asyncio.gather(
-                        *(
-                            _call(a, m, temp, max_tokens, client)
-                            for a, m in zip(cycle(agents), msgs)
-                        )
-                    )
-                    responses, calls = [t for t, _ in res if t], [info for _, info in res]
+        case Refine(agents, prompt, temp, max_tokens):
+            if responses:
+                msgs: list[list[Message]] = [
+                    [{"role": "user", "content": prompt.format(text=o, query=query)}]
+                    for o in responses
+                ]
+                res = await asyncio.gather(
+                    *(_call(a, m, temp, max_tokens, ctx) for a, m in zip(cycle(agents), msgs))
+                )
+                responses = [t for t, _ in res if t]
+                calls = [info for _, infos in res for info in infos]
 
-            case Rank(agent, n, prompt, temp, max_tokens):
-                if responses:
+        case Rank(agent, n, prompt, temp, max_tokens, normalize):
+            if responses:
+                local = normalize is not None or agent is None
+                tally = _tally(responses, normalize, weights) if local else []
+                if agent is None or _majority(tally):
+                    responses = [x for _, x in tally[:n]]
+                    extra["votes"] = [v for v, _ in tally]
+                else:
                     p = prompt.format(query=query, responses=_enumerate(responses), n=n)
-                    text, info = await _call(
-                        agent, [{"role": "user", "content": p}], temp, max_tokens, client
+                    text, infos = await _call(
+                        agent, [{"role": "user", "content": p}], temp, max_tokens, ctx
                     )
-                    calls = [info]
+                    calls = infos
                     if not text:
                         responses = responses[:n]
                     else:
                         idx = _rank(text, max_len=len(responses), n=n)
                         responses = [responses[i] for i in idx] if idx else responses[:n]
 
-            case Vote(agent, prompt, temp, max_tokens):
-                if responses:
-                    text, info = await _call(
-                        agent, _msgs(prompt, responses, query), temp, max_tokens, client
-                    )
-                    calls = [info]
+        case Vote(agent, prompt, temp, max_tokens, budget, normalize):
+            if responses:
+                local = normalize is not None or agent is None
+                tally = _tally(responses, normalize, weights) if local else []
+                if agent is None or _majority(tally):
+                    responses = [tally[0][1]]
+                    extra["votes"] = [v for v, _ in tally]
+                else:
+                    m = _msgs(prompt, responses, query, budget, weights, ctx.prefix_cache)
+                    text, infos = await _call(agent, m, temp, max_tokens, ctx, stream=True)
+                    calls = infos
                     if text:
                         responses = [text]
 
-            case Shuffle():
-                if responses:
-                    responses = random.sample(responses, len(responses))
+        case Shuffle():
+            if responses:
+                responses = _rng(ctx).sample(responses, len(responses))
+            extra["seed"] = ctx.seed
+
+        case Dropout(rate):
+            rng = _rng(ctx)
+            prev = responses
+            responses = [o for o in responses if rng.random() > rate]
+            if prev and not responses:
+                responses = [rng.choice(prev)]
+            extra["seed"] = ctx.seed
+
+        case Sample(n):
+            responses = _rng(ctx).sample(responses, min(n, len(responses)))
+            extra["seed"] = ctx.seed
 
-            case Dropout(rate):
-                prev = responses
-                responses = [o for o in responses if random.random() > rate]
-                if prev and not responses:
-                    responses = [random.choice(prev)]
+        case Take(n):
+            responses = responses[:n]
 
-            case Sample(n):
-                responses = random.sample(responses, min(n, len(responses)))
+        case Dedupe(threshold):
+            groups = clusters(responses, threshold)
+            responses = [responses[g[0]] for g in groups]
+            extra["clusters"] = [len(g) for g in groups]
 
-            case Take(n):
-                responses = responses[:n]
+        case Filter(fn, _, executor):
+            keep, extra["item_times"] = await _apply(fn, responses, executor or ctx.executor)
+            responses = [o for o, k in zip(responses, keep, strict=True) if k]
 
-            case Filter(fn):
-                responses = [o for o in responses if fn(o)]
+        case Map(fn, executor):
+            responses, extra["item_times"] = await _apply(fn, responses, executor or ctx.executor)
 
-            case Map(fn):
-                responses = [fn(o) for o in responses]
+        case Route(inner, router, n):
+            text = query if isinstance(inner, Propose) else query + "".join(responses)
+            chosen, skipped = router.select(inner.agents, n, len(text) // 4, inner.max_tokens)
+            responses, calls, extra = await _step(
+                inner._replace(agents=chosen), responses, query, ctx, weights
+            )
+            if router not in ctx.hooks:
+                for info in calls:
+                    router.observe(info)
+            extra |= {"routed": chosen, "skipped": skipped}
 
-        history.append(
-            {
+        case Gate(predicate):
+            extra["branch"] = "then" if predicate(responses) else "else"
+
+    return responses, calls, extra
+
+
+_WATCHED = (Propose, Synthesize, Refine, Route)
+
+
+def _replay(
+    steps: list[Any], saved: list[dict[str, Any]], history: History | list[dict[str, Any]]
+) -> None:
+    records = saved[len(history) : len(history) + len(steps)]
+    names = [type(step).__name__ for step in steps]
+    if [r["step"] for r in records] != names:
+        raise ValueError(f"checkpoint does not match pipeline at step {len(history)}: {names}")
+    history.extend(records)
+
+
+async def _steps(
+    pipeline: list[Any],
+    responses: list[str],
+    query: str,
+    ctx: _Run,
+    history: History | list[dict[str, Any]],
+    base: int = 0,
+    saved: list[dict[str, Any]] | None = None,
+) -> list[str]:
+    # Cluster sizes from Dedupe, by text, so Vote can weight surviving representatives
+    weights: dict[str, int] = {}
+    n = 0
+    while n < len(pipeline):
+        step = pipeline[n]
+        end = n + 1
+        if isinstance(step, (Propose, Synthesize)):
+            while end < len(pipeline) and _overlaps(pipeline[end]):
+                end += 1
+        nxt = pipeline[end] if end < len(pipeline) else None
+        # A streaming Filter watches the calls of the LLM step right before it
+        watch = nxt.partial if isinstance(nxt, Filter) and isinstance(step, _WATCHED) else None
+        if saved and len(history) < len(saved):
+            _replay(pipeline[n:end], saved, history)
+            responses = history[-1]["outputs"].copy()
+        elif end > n + 1:
+            responses = await _pipelined(
+                pipeline[n:end], responses, query, ctx._replace(watch=watch), history, base
+            )
+        else:
+            i = base + len(history)
+            t0 = time.time()
+            _step_started(ctx, i, step)
+            responses, calls, extra = await _step(
+                step, responses, query, ctx._replace(pos=i, watch=watch), weights
+            )
+            record = {
                 "step": type(step).__name__,
                 "outputs": responses.copy(),
                 "llm_calls": calls,
                 "step_time": time.time() - t0,
+                **extra,
             }
-        )
+            _step_ended(ctx, i, record)
+            history.append(record)
+        n = end
+        record = history[-1]
+        if "clusters" in record:
+            weights.update(zip(responses, record["clusters"], strict=True))
+        if record.get("branch") == "then":
+            pipeline = [*pipeline[:n], *step.then]
+        if ctx.checkpoint is not None and len(history) > len(saved or ()):
+            ctx.checkpoint.save(ctx.run_id, list(history))
+    return responses
+
+
+async def _traced(ctx: _Run, query: str, aw: Awaitable[tuple[str, History]]) -> tuple[str, History]:
+    if not ctx.hooks:
+        return await aw
+    for h in ctx.hooks:
+        h.on_run_start(ctx.run_id, query)
+    try:
+        result, history = await aw
+    except BaseException as e:
+        for h in ctx.hooks:
+            h.on_run_end(ctx.run_id, None, e)
+        raise
+    for h in ctx.hooks:
+        h.on_run_end(ctx.run_id, result, None)
+    return result, history
+
 
+async def _execute(pipeline: list[Any], query: str, ctx: _Run) -> tuple[str, History]:
+    history = History(detail=ctx.detail)
+    saved = ctx.checkpoint.load(ctx.run_id) if ctx.checkpoint is not None else None
+    responses = await _steps(pipeline, [], query, ctx, history, saved=saved)
+    history._close()
     return (responses[0] if responses else ""), history
+
+
+def _run_id(checkpoint: CheckpointStore | None, resume: str | None) -> str:
+    # A generated id is never returned, so a checkpoint saved under it could never be resumed
+    if checkpoint is not None and resume is None:
+        raise ValueError("checkpoint= requires resume= to name the run")
+    return resume or uuid.uuid4().hex
+
+
+# TODO: pipeline type annotation
+async def run(
+    pipeline: list[Any],
+    query: str,
+    client: Client,
+    *,
+    scheduler: Scheduler | None = None,
+    cache: Cache | None = None,
+    retry: Retry | None = None,
+    hooks: Sequence[Hooks] = (),
+    coalesce: SingleFlight | None = None,
+    checkpoint: CheckpointStore | None = None,
+    resume: str | None = None,
+    detail: Detail = "full",
+    prefix_cache: bool = False,
+    seed: Seed = None,
+    executor: Offload = "inline",
+) -> tuple[str, History]:
+    ctx = _Run(
+        client,
+        scheduler,
+        _run_id(checkpoint, resume),
+        cache,
+        retry=retry,
+        hooks=hooks,
+        checkpoint=checkpoint,
+        coalesce=coalesce,
+        detail=detail,
+        prefix_cache=prefix_cache,
+        seed=_seed(seed, query),
+        executor=executor,
+    )
+    return await _traced(ctx, query, _execute(pipeline, query, ctx))
+
+
+async def run_stream(
+    pipeline: list[Any],
+    query: str,
+    client: Client,
+    *,
+    scheduler: Scheduler | None = None,
+    cache: Cache | None = None,
+    retry: Retry | None = None,
+    hooks: Sequence[Hooks] = (),
+    coalesce: SingleFlight | None = None,
+    checkpoint: CheckpointStore | None = None,
+    resume: str | None = None,
+    detail: Detail = "full",
+    prefix_cache: bool = False,
+    seed: Seed = None,
+    executor: Offload = "inline",
+) -> AsyncIterator[Event]:
+    """Run ``pipeline`` and yield progress events as they happen, ending with ``Done``.
+
+    With a streaming client, ``Aggregate`` and ``Vote`` calls also yield ``Token`` deltas.
+    Steps restored from a checkpoint emit no events.
+    """
+    events: asyncio.Queue[Event | None] = asyncio.Queue()
+    ctx = _Run(
+        client,
+        scheduler,
+        _run_id(checkpoint, resume),
+        cache,
+        events.put_nowait,
+        retry=retry,
+        hooks=hooks,
+        checkpoint=checkpoint,
+        coalesce=coalesce,
+        detail=detail,
+        prefix_cache=prefix_cache,
+        seed=_seed(seed, query),
+        executor=executor,
+    )
+    task = asyncio.create_task(_traced(ctx, query, _execute(pipeline, query, ctx)))
+    task.add_done_callback(lambda _: events.put_nowait(None))
+    try:
+        while (event := await events.get()) is not None:
+            yield event
+        yield Done(*task.result())
+    finally:
+        task.cancel()
+
+
+async def _aiter(queries: Iterable[str] | AsyncIterable[str]) -> AsyncIterator[str]:
+    if isinstance(queries, AsyncIterable):
+        async for q in queries:
+            yield q
+    else:
+        for q in queries:
+            yield q
+
+
+async def run_many(
+    pipeline: list[Any],
+    queries: Iterable[str] | AsyncIterable[str],
+    client: Client,
+    *,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    scheduler: Scheduler | None = None,
+    cache: Cache | None = None,
+    retry: Retry | None = None,
+    hooks: Sequence[Hooks] = (),
+    coalesce: SingleFlight | None = None,
+    checkpoint: CheckpointStore | None = None,
+    resume: str | None = None,
+    detail: Detail = "full",
+    prefix_cache: bool = False,
+    seed: Seed = None,
+    executor: Offload = "inline",
+) -> AsyncIterator[tuple[int, str, History]]:
+    """Run ``pipeline`` over ``queries``, yielding ``(index, result, history)`` as runs finish.
+
+    At most ``concurrency`` queries are in flight and ``queries`` is consumed
+    lazily, so memory stays bounded for arbitrarily long inputs. Without an
+    explicit ``scheduler``, LLM calls from every run share a global budget of
+    ``concurrency`` calls. With ``resume``, query ``i`` checkpoints under
+    ``f"{resume}/{i}"``, so rerunning a crashed batch only pays for unfinished steps.
+    """
+    _run_id(checkpoint, resume)
+    sched = scheduler or Scheduler(concurrency=concurrency)
+
+    async def one(i: int, q: str) -> tuple[int, str, History]:
+        result, history = await run(
+            pipeline,
+            q,
+            client,
+            scheduler=sched,
+            cache=cache,
+            retry=retry,
+            hooks=hooks,
+            coalesce=coalesce,
+            checkpoint=checkpoint,
+            resume=f"{resume}/{i}" if resume is not None else None,
+            detail=detail,
+            prefix_cache=prefix_cache,
+            seed=seed,
+            executor=executor,
+        )
+        return i, result, history
+
+    source = _aiter(queries)
+    pending: set[asyncio.Task[tuple[int, str, History]]] = set()
+    i = 0
+    try:
+        while True:
+            async for q in source:
+                pending.add(asyncio.create_task(one(i, q)))
+                i += 1
+                if len(pending) >= concurrency:
+                    break
+            if not pending:
+                return
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield task.result()
+    finally:
+        for task in pending:
+            task.cancel()
@@ -0,0 +1,148 @@
+"""Graph pipelines: independent branches run concurrently, joins merge their outputs."""
+
+from __future__ import annotations
+
+import asyncio
+import uuid
+from collections.abc import Callable, Sequence
+from typing import Any, NamedTuple
+
+from .cache import Cache
+from .coalesce import SingleFlight
+from .core import Client, Gate, Offload, Seed, _Run, _seed, _steps, _traced
+from .history import Detail, History
+from .hooks import Hooks
+from .retry import Retry
+from .scheduler import Scheduler
+
+
+def concat(inputs: list[list[str]]) -> list[str]:
+    return [x for xs in inputs for x in xs]
+
+
+def interleave(inputs: list[list[str]]) -> list[str]:
+    out: list[str] = []
+    for i in range(max(map(len, inputs), default=0)):
+        out.extend(xs[i] for xs in inputs if i < len(xs))
+    return out
+
+
+class Node(NamedTuple):
+    steps: Any
+    after: tuple[str, ...] = ()
+    merge: Callable[[list[list[str]]], list[str]] = concat
+
+
+def _as_list(steps: Any) -> list[Any]:
+    return steps if isinstance(steps, list) else [steps]
+
+
+def _span(steps: list[Any]) -> int:
+    """Most steps ``steps`` can record, following whichever ``Gate`` branch is longer."""
+    for i, step in enumerate(steps):
+        if isinstance(step, Gate):
+            return i + 1 + max(_span(steps[i + 1 :]), _span(list(step.then)))
+    return len(steps)
+
+
+def _check(graph: dict[str, Node]) -> list[str]:
+    """Topological order of ``graph``; raises ValueError on unknown inputs or cycles."""
+    order: list[str] = []
+    state: dict[str, int] = {}
+
+    def visit(name: str, path: tuple[str, ...]) -> None:
+        if state.get(name) == 2:
+            return
+        if state.get(name) == 1:
+            raise ValueError(f"cycle in graph: {' -> '.join((*path, name))}")
+        if name not in graph:
+            raise ValueError(f"unknown node {name!r} in {path[-1]!r}.after")
+        state[name] = 1
+        for up in graph[name].after:
+            visit(up, (*path, name))
+        state[name] = 2
+        order.append(name)
+
+    for name in graph:
+        visit(name, ())
+    return order
+
+
+def _sink(graph: dict[str, Node]) -> str:
+    used = {up for node in graph.values() for up in node.after}
+    sinks = [name for name in graph if name not in used]
+    if len(sinks) != 1:
+        raise ValueError(f"graph has {len(sinks)} sink nodes {sinks}; pass output=")
+    return sinks[0]
+
+
+async def run_graph(
+    graph: dict[str, Node],
+    query: str,
+    client: Client,
+    *,
+    output: str | None = None,
+    scheduler: Scheduler | None = None,
+    cache: Cache | None = None,
+    retry: Retry | None = None,
+    hooks: Sequence[Hooks] = (),
+    coalesce: SingleFlight | None = None,
+    detail: Detail = "full",
+    prefix_cache: bool = False,
+    seed: Seed = None,
+    executor: Offload = "inline",
+) -> tuple[str, History]:
+    """Run a pipeline graph. Each node runs its steps on the merged outputs of ``after``.
+
+    Nodes start as soon as their inputs are ready, so independent branches
+    overlap. History records carry a ``node`` key and are listed in
+    topological order. ``run(pipeline, ...)`` is equivalent to the one-node
+    graph ``{"main": Node(pipeline)}``.
+    """
+    order = _check(graph)
+    output = output or _sink(graph)
+    ctx = _Run(
+        client,
+        scheduler,
+        uuid.uuid4().hex,
+        cache,
+        retry=retry,
+        hooks=hooks,
+        coalesce=coalesce,
+        prefix_cache=prefix_cache,
+        seed=_seed(seed, query),
+        executor=executor,
+    )
+    steps = {name: _as_list(graph[name].steps) for name in order}
+    # Each node gets positions for its longest path through Gate branches, in history
+    # order, so concurrent nodes never share one
+    bases: dict[str, int] = {}
+    pos = 0
+    for name in order:
+        bases[name] = pos
+        pos += _span(steps[name])
+    tasks: dict[str, asyncio.Task[tuple[list[str], list[dict[str, Any]]]]] = {}
+
+    async def node(name: str) -> tuple[list[str], list[dict[str, Any]]]:
+        spec = graph[name]
+        inputs = [(await tasks[up])[0] for up in spec.after]
+        responses = spec.merge(inputs) if inputs else []
+        history: list[dict[str, Any]] = []
+        responses = await _steps(steps[name], responses, query, ctx, history, bases[name])
+        for record in history:
+            record["node"] = name
+        return responses, history
+
+    async def execute() -> tuple[str, History]:
+        for name in order:
+            tasks[name] = asyncio.create_task(node(name))
+        try:
+            await asyncio.gather(*tasks.values())
+        finally:
+            for task in tasks.values():
+                task.cancel()
+        history = [record for name in order for record in tasks[name].result()[1]]
+        responses = tasks[output].result()[0]
+        return (responses[0] if responses else ""), History(history, detail)
+
+    return await _traced(ctx, query, execute())
@@ -0,0 +1,154 @@
+"""Compact run history: texts stored once, records materialized on access."""
+
+from __future__ import annotations
+
+from array import array
+from collections.abc import Iterable, Iterator, Sequence
+from typing import Any, Literal, NamedTuple, overload
+
+Detail = Literal["full", "final", "metrics"]
+
+_CALL = ("model", "time", "in_tokens", "out_tokens")
+_STEP = ("step", "outputs", "llm_calls", "step_time")
+
+
+class _Call(NamedTuple):
+    model: int  # Index into History.texts
+    time: float
+    in_tokens: int
+    out_tokens: int
+    extra: dict[str, Any] | None
+
+
+class _Step:
+    __slots__ = ("name", "outputs", "calls", "time", "extra")
+
+    def __init__(
+        self,
+        name: str,
+        outputs: array[int] | list[str] | None,
+        calls: tuple[_Call, ...],
+        time: float,
+        extra: dict[str, Any] | None,
+    ) -> None:
+        self.name = name
+        self.outputs = outputs
+        self.calls = calls
+        self.time = time
+        self.extra = extra
+
+
+class History(Sequence[dict[str, Any]]):
+    """Sequence of step records, as returned by ``run()``.
+
+    Each distinct string (response or model name) is stored once in
+    ``texts`` and steps refer to it by index. Indexing or iterating yields
+    fresh record dicts in the original format; ``to_dicts()`` returns them
+    all. ``detail="final"`` keeps only the last step's outputs and
+    ``detail="metrics"`` keeps no outputs; dropped outputs read as ``[]``.
+
+    Runs append each record as its step ends. Outside ``"full"``, only the
+    newest step's outputs are held (not interned), so earlier outputs are
+    freed while the run goes on.
+    """
+
+    __slots__ = ("texts", "_steps", "_index", "_detail")
+
+    def __init__(self, records: Iterable[dict[str, Any]] = (), detail: Detail = "full") -> None:
+        self.texts: list[str] = []
+        self._index: dict[str, int] = {}
+        self._steps: list[_Step] = []
+        self._detail = detail
+        self.extend(records)
+        self._close()
+
+    def append(self, record: dict[str, Any]) -> None:
+        if self._detail != "full" and self._steps:
+            self._steps[-1].outputs = None
+        self._steps.append(self._compact(record))
+
+    def extend(self, records: Iterable[dict[str, Any]]) -> None:
+        for r in records:
+            self.append(r)
+
+    def _close(self) -> None:
+        """Called once the run is over: drops what ``detail`` doesn't keep of the last step."""
+        if self._detail == "metrics" and self._steps:
+            self._steps[-1].outputs = None
+        self._index.clear()
+
+    def _intern(self, text: str) -> int:
+        i = self._index.get(text)
+        if i is None:
+            i = self._index[text] = len(self.texts)
+            self.texts.append(text)
+        return i
+
+    def _compact(self, record: dict[str, Any]) -> _Step:
+        calls = tuple(
+            _Call(
+                self._intern(c["model"]),
+                c["time"],
+                c["in_tokens"],
+                c["out_tokens"],
+                {k: v for k, v in c.items() if k not in _CALL} or None,
+            )
+            for c in record["llm_calls"]
+        )
+        outputs: array[int] | list[str]
+        if self._detail == "full":
+            outputs = array("L", map(self._intern, record["outputs"]))
+        else:
+            outputs = list(record["outputs"])
+        extra = {k: v for k, v in record.items() if k not in _STEP} or None
+        return _Step(record["step"], outputs, calls, record["step_time"], extra)
+
+    def _record(self, s: _Step) -> dict[str, Any]:
+        texts = self.texts
+        outputs = s.outputs if s.outputs is not None else ()
+        return {
+            "step": s.name,
+            "outputs": [texts[i] for i in outputs] if isinstance(outputs, array) else list(outputs),
+            "llm_calls": [
+                {
+                    "model": texts[c.model],
+                    "time": c.time,
+                    "in_tokens": c.in_tokens,
+                    "out_tokens": c.out_tokens,
+                    **(c.extra or {}),
+                }
+                for c in s.calls
+            ],
+            "step_time": s.time,
+            **(s.extra or {}),
+        }
+
+    def __len__(self) -> int:
+        return len(self._steps)
+
+    @overload
+    def __getitem__(self, i: int) -> dict[str, Any]: ...
+
+    @overload
+    def __getitem__(self, i: slice) -> list[dict[str, Any]]: ...
+
+    def __getitem__(self, i: int | slice) -> dict[str, Any] | list[dict[str, Any]]:
+        if isinstance(i, slice):
+            return [self._record(s) for s in self._steps[i]]
+        return self._record(self._steps[i])
+
+    def __iter__(self) -> Iterator[dict[str, Any]]:
+        return map(self._record, self._steps)
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, (History, list)):
+            return self.to_dicts() == list(other)
+        return NotImplemented
+
+    __hash__ = None  # type: ignore[assignment]
+
+    def __repr__(self) -> str:
+        return f"History({self.to_dicts()!r})"
+
+    def to_dicts(self) -> list[dict[str, Any]]:
+        return list(self)
@@ -0,0 +1,35 @@
+"""Instrumentation callbacks for runs, steps and LLM calls."""
+
+from __future__ import annotations
+
+from typing import Any
+
+
+class Hooks:
+    """Base class for instrumentation; override the callbacks you need.
+
+    Callbacks run inline on the event loop as things happen, so they see
+    partial progress even when ``run()`` later raises. Keep them cheap.
+    ``run_id`` identifies the run and ``pos`` the step's index in its history.
+    """
+
+    def on_run_start(self, run_id: str, query: str) -> None:
+        pass
+
+    def on_run_end(self, run_id: str, result: str | None, error: BaseException | None) -> None:
+        pass
+
+    def on_step_start(self, run_id: str, pos: int, step: Any) -> None:
+        pass
+
+    def on_step_end(self, run_id: str, pos: int, record: dict[str, Any]) -> None:
+        pass
+
+    def on_call_start(self, run_id: str, pos: int, model: str) -> None:
+        pass
+
+    def on_call_end(self, run_id: str, pos: int, info: dict[str, Any]) -> None:
+        pass
+
+    def on_call_error(self, run_id: str, pos: int, info: dict[str, Any]) -> None:
+        pass
@@ -0,0 +1,117 @@
+"""OpenTelemetry spans and metrics for pipeline runs.
+
+Requires ``opentelemetry-api`` (``pip install mixture-llm[otel]``).
+"""
+
+from __future__ import annotations
+
+import time
+from typing import Any
+
+try:
+    from opentelemetry import metrics, trace
+    from opentelemetry.trace import Span, Status, StatusCode
+except ImportError as e:  # pragma: no cover
+    raise ImportError(
+        "mixture_llm.otel requires opentelemetry-api: pip install 'mixture-llm[otel]'"
+    ) from e
+
+from .hooks import Hooks
+
+
+class OTelHooks(Hooks):
+    """Emits ``run -> step -> llm_call`` spans and per-model call metrics.
+
+    Metrics: ``llm.call.duration`` and ``llm.call.queue_wait`` histograms,
+    ``llm.tokens.input``/``llm.tokens.output`` and ``llm.call.errors``
+    counters, all tagged with ``model``. Cache hits are traced but not
+    counted as token usage.
+    """
+
+    def __init__(
+        self, tracer: trace.Tracer | None = None, meter: metrics.Meter | None = None
+    ) -> None:
+        self.tracer = tracer or trace.get_tracer("mixture_llm")
+        meter = meter or metrics.get_meter("mixture_llm")
+        self.duration = meter.create_histogram("llm.call.duration", unit="s")
+        self.queue_wait = meter.create_histogram("llm.call.queue_wait", unit="s")
+        self.tokens_in = meter.create_counter("llm.tokens.input")
+        self.tokens_out = meter.create_counter("llm.tokens.output")
+        self.errors = meter.create_counter("llm.call.errors")
+        self._runs: dict[str, Span] = {}
+        self._steps: dict[tuple[str, int], Span] = {}
+
+    def on_run_start(self, run_id: str, query: str) -> None:
+        self._runs[run_id] = self.tracer.start_span(
+            "mixture_llm.run", attributes={"mixture_llm.run_id": run_id}
+        )
+
+    def on_run_end(self, run_id: str, result: str | None, error: BaseException | None) -> None:
+        span = self._runs.pop(run_id, None)
+        if span is not None:
+            _finish(span, error)
+        for key in [k for k in self._steps if k[0] == run_id]:
+            _finish(self._steps.pop(key), error)
+
+    def on_step_start(self, run_id: str, pos: int, step: Any) -> None:
+        name = type(step).__name__
+        self._steps[run_id, pos] = self.tracer.start_span(
+            f"mixture_llm.step {name}",
+            context=_under(self._runs.get(run_id)),
+            attributes={"mixture_llm.step": name, "mixture_llm.pos": pos},
+        )
+
+    def on_step_end(self, run_id: str, pos: int, record: dict[str, Any]) -> None:
+        span = self._steps.pop((run_id, pos), None)
+        if span is not None:
+            span.set_attribute("mixture_llm.outputs", len(record["outputs"]))
+            span.end()
+
+    def on_call_end(self, run_id: str, pos: int, info: dict[str, Any]) -> None:
+        self._call(run_id, pos, info)
+
+    def on_call_error(self, run_id: str, pos: int, info: dict[str, Any]) -> None:
+        self._call(run_id, pos, info)
+
+    def _call(self, run_id: str, pos: int, info: dict[str, Any]) -> None:
+        model = {"model": info["model"]}
+        end = time.time_ns()
+        start = end - int((info["time"] + info.get("queue_wait", 0.0)) * 1e9)
+        attributes = {
+            "mixture_llm.model": info["model"],
+            "mixture_llm.in_tokens": info["in_tokens"],
+            "mixture_llm.out_tokens": info["out_tokens"],
+        }
+        for key in ("queue_wait", "cached", "coalesced", "cancelled", "attempt"):
+            if key in info:
+                attributes[f"mixture_llm.{key}"] = info[key]
+        span = self.tracer.start_span(
+            "mixture_llm.llm_call",
+            context=_under(self._steps.get((run_id, pos))),
+            start_time=start,
+            attributes=attributes,
+        )
+        if "error" in info:
+            span.set_status(Status(StatusCode.ERROR, info["error"]))
+            self.errors.add(1, model)
+        span.end(end_time=end)
+
+        if "queue_wait" in info:
+            self.queue_wait.record(info["queue_wait"], model)
+        # Cache hits and coalesced followers cost nothing; their time is waiting, not a call
+        if info.get("cached") or info.get("coalesced") or "cancelled" in info:
+            return
+        self.duration.record(info["time"], model)
+        self.tokens_in.add(info["in_tokens"], model)
+        self.tokens_out.add(info["out_tokens"], model)
+
+
+def _under(parent: Span | None) -> Any:
+    return trace.set_span_in_context(parent) if parent is not None else None
+
+
+def _finish(span: Span, error: BaseException | None) -> None:
+    if error is not None:
+        span.record_exception(error)
+        span.set_status(Status(StatusCode.ERROR, repr(error)))
+    span.end()
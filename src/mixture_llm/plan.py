@@ -0,0 +1,207 @@
+"""Static pipeline plans: validation and worst-case call and token counts before a run."""
+
+from __future__ import annotations
+
+from itertools import cycle
+from typing import Any, NamedTuple
+
+from .budget import Budget, estimate
+from .core import (
+    DEFAULT_MAX_TOKENS,
+    Aggregate,
+    Client,
+    Dedupe,
+    Dropout,
+    Filter,
+    Gate,
+    Map,
+    Propose,
+    Rank,
+    Refine,
+    Route,
+    Sample,
+    Shuffle,
+    Synthesize,
+    Take,
+    Vote,
+    run,
+)
+from .history import History
+
+# Steps that prompt with the responses they are given
+_NEEDS_INPUT = (Synthesize, Aggregate, Refine, Rank, Vote)
+
+
+class StepPlan(NamedTuple):
+    step: Any
+    fanin: int  # Most responses the step can receive
+    fanout: int  # Most responses it can return
+    calls: int
+    in_tokens: int
+    out_tokens: int
+
+
+class Plan(NamedTuple):
+    """A validated pipeline with worst-case LLM usage per query, as built by ``compile()``.
+
+    ``steps`` follows the pipeline as written. Totals cover the costlier of
+    each ``Gate``'s two continuations, and count one attempt per call
+    (no retries or hedges).
+    """
+
+    pipeline: list[Any]
+    steps: list[StepPlan]
+    models: dict[str, tuple[int, int, int]]  # model -> (calls, in_tokens, out_tokens)
+    warnings: list[str]
+
+    @property
+    def calls(self) -> int:
+        return sum(c for c, _, _ in self.models.values())
+
+    @property
+    def in_tokens(self) -> int:
+        return sum(i for _, i, _ in self.models.values())
+
+    @property
+    def out_tokens(self) -> int:
+        return sum(o for _, _, o in self.models.values())
+
+    def cost(self, prices: dict[str, tuple[float, float]]) -> float:
+        """Worst-case dollars per query; ``prices`` as for ``Router``, per million tokens."""
+        total = 0.0
+        for model, (_, i, o) in self.models.items():
+            price_in, price_out = prices.get(model, (0.0, 0.0))
+            total += i * price_in + o * price_out
+        return total / 1e6
+
+    async def run(self, query: str, client: Client, **options: Any) -> tuple[str, History]:
+        return await run(self.pipeline, query, client, **options)
+
+
+def _prompt(prompt: str, query: int, n: int, size: int, budget: Budget | None) -> int:
+    fixed = estimate(prompt) + query
+    if budget is None:
+        return fixed + n * size
+    return min(fixed + n * size, max(budget.tokens, fixed))
+
+
+def _add(usage: dict[str, tuple[int, int, int]], model: str, i: int, o: int) -> None:
+    c0, i0, o0 = usage.get(model, (0, 0, 0))
+    usage[model] = (c0 + 1, i0 + i, o0 + o)
+
+
+def _walk(
+    steps: list[Any],
+    n: int,
+    size: int,
+    query: int,
+    pos: int,
+    usage: dict[str, tuple[int, int, int]],
+    warnings: list[str],
+) -> list[StepPlan]:
+    """Plans for ``steps`` given at most ``n`` inputs of ``size`` tokens; adds to ``usage``."""
+    plans: list[StepPlan] = []
+    for i, step in enumerate(steps):
+        where = f"{type(step).__name__} at step {pos + i}"
+        inner = step
+        if isinstance(step, Route):
+            if not isinstance(step.step, (Propose, Synthesize)):
+                raise TypeError(f"{where} can only route Propose or Synthesize")
+            inner = step.step._replace(agents=step.step.agents[: step.n or None])
+        if isinstance(inner, _NEEDS_INPUT) and not n:
+            raise ValueError(f"{where} has no input responses")
+        if isinstance(inner, (Propose, Synthesize, Refine)):
+            if not inner.agents:
+                raise ValueError(f"{where} has no agents")
+            quorum = getattr(inner, "quorum", None)
+            if quorum is not None and not 0 < quorum <= len(inner.agents):
+                raise ValueError(f"{where} has quorum {quorum} for {len(inner.agents)} agents")
+        fanin = n
+        calls: list[tuple[str, int, int]] = []
+        match inner:
+            case Propose(agents, _, max_tokens):
+                calls = [(m, query, max_tokens) for m in agents]
+                n, size = len(agents), max_tokens
+
+            case Synthesize(agents, prompt, _, max_tokens):
+                p = _prompt(prompt, query, n, size, inner.budget)
+                calls = [(m, p, max_tokens) for m in agents]
+                n, size = len(agents), max_tokens
+
+            case Aggregate(agent, prompt, _, max_tokens, budget):
+                calls = [(agent, _prompt(prompt, query, n, size, budget), max_tokens)]
+                n, size = 1, max_tokens
+
+            case Refine(agents, prompt, _, max_tokens):
+                p = estimate(prompt) + query + size
+                calls = [(m, p, max_tokens) for m, _ in zip(cycle(agents), range(n))]
+                size = max_tokens
+
+            case Rank(agent, k, prompt, _, max_tokens):
+                if agent is not None:
+                    calls = [(agent, _prompt(prompt, query, n, size, None), max_tokens)]
+                if k > n:
+                    warnings.append(f"{where} keeps {k} of at most {n} responses")
+                n = min(n, k)
+
+            case Vote(agent, prompt, _, max_tokens, budget):
+                if agent is not None:
+                    calls = [(agent, _prompt(prompt, query, n, size, budget), max_tokens)]
+                    size = max(size, max_tokens)
+                n = 1
+
+            case Sample(k) | Take(k):
+                if k > n:
+                    warnings.append(f"{where} keeps {k} of at most {n} responses")
+                n = min(n, k)
+
+            case Dropout(rate):
+                if not 0 <= rate <= 1:
+                    raise ValueError(f"{where} has rate {rate} outside [0, 1]")
+
+            case Shuffle() | Dedupe() | Filter() | Map():
+                pass
+
+            case Gate(_, then):
+                plans.append(StepPlan(step, fanin, n, 0, 0, 0))
+                rest: dict[str, tuple[int, int, int]] = {}
+                branch: dict[str, tuple[int, int, int]] = {}
+                plans += _walk(steps[i + 1 :], n, size, query, pos + i + 1, rest, warnings)
+                _walk(list(then), n, size, query, pos + i + 1, branch, warnings)
+                for m in rest.keys() | branch.keys():
+                    a, b = rest.get(m, (0, 0, 0)), branch.get(m, (0, 0, 0))
+                    c0, i0, o0 = usage.get(m, (0, 0, 0))
+                    usage[m] = (c0 + max(a[0], b[0]), i0 + max(a[1], b[1]), o0 + max(a[2], b[2]))
+                return plans
+
+            case _:
+                raise TypeError(f"unknown step {step!r} at step {pos + i}")
+
+        for m, in_tok, out_tok in calls:
+            _add(usage, m, in_tok, out_tok)
+        in_total = sum(c[1] for c in calls)
+        out_total = sum(c[2] for c in calls)
+        plans.append(StepPlan(step, fanin, n, len(calls), in_total, out_total))
+    return plans
+
+
+def compile(
+    pipeline: list[Any],
+    *,
+    query_tokens: int = 256,
+    inputs: int = 0,
+    input_tokens: int = DEFAULT_MAX_TOKENS,
+) -> Plan:
+    """Validate ``pipeline`` and estimate its worst-case LLM usage for one query.
+
+    Raises ``TypeError`` for unknown steps and ``ValueError`` for steps that
+    can never run as configured, such as a ``Synthesize`` with no input.
+    Steps that can run but look wrong, such as ``Rank(n=5)`` after three
+    proposers, are listed in ``warnings``. Token counts assume queries of
+    ``query_tokens`` and responses as long as their ``max_tokens``. For a
+    graph node, ``inputs`` and ``input_tokens`` describe its merged input.
+    """
+    usage: dict[str, tuple[int, int, int]] = {}
+    warnings: list[str] = []
+    steps = _walk(list(pipeline), inputs, input_tokens, query_tokens, 0, usage, warnings)
+    return Plan(list(pipeline), steps, usage, warnings)
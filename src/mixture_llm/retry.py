@@ -0,0 +1,81 @@
+"""Retry, hedging and fallback policy for LLM calls."""
+
+from __future__ import annotations
+
+import asyncio
+import random
+from collections import deque
+from collections.abc import Callable
+
+from .scheduler import is_rate_limit
+
+RETRYABLE_STATUS = frozenset({408, 409, 425, 429, 500, 502, 503, 504, 529})
+RETRYABLE_NAMES = ("timeout", "connection", "ratelimit", "unavailable", "overloaded", "internal")
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Transient failures: timeouts, connection drops, rate limits and 5xx responses."""
+    status = getattr(error, "status_code", None) or getattr(error, "status", None)
+    if isinstance(status, int):
+        return status in RETRYABLE_STATUS
+    if isinstance(error, (ConnectionError, TimeoutError, asyncio.TimeoutError)):
+        return True
+    name = type(error).__name__.lower()
+    return is_rate_limit(error) or any(n in name for n in RETRYABLE_NAMES)
+
+
+class Retry:
+    """How ``_call`` recovers from failed and slow calls.
+
+    Each model gets up to ``attempts`` tries with exponential backoff (full
+    jitter, capped at ``max_backoff``) while ``retry_on`` classifies the error
+    as transient, then moves on to the next model in ``fallbacks[model]``.
+    With ``hedge`` set, a duplicate request is fired once a call outlives that
+    latency percentile (0-1) of the model's recent successes, or ``hedge_after``
+    seconds, and the first answer wins.
+    """
+
+    def __init__(
+        self,
+        attempts: int = 3,
+        *,
+        backoff: float = 0.5,
+        max_backoff: float = 8.0,
+        jitter: bool = True,
+        retry_on: Callable[[BaseException], bool] = is_retryable,
+        fallbacks: dict[str, list[str]] | None = None,
+        hedge: float | None = None,
+        hedge_after: float | None = None,
+        min_samples: int = 20,
+        window: int = 200,
+    ) -> None:
+        self.attempts = attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.retry_on = retry_on
+        self.fallbacks = fallbacks or {}
+        self.hedge = hedge
+        self.hedge_after = hedge_after
+        self.min_samples = min_samples
+        self.window = window
+        self._latency: dict[str, deque[float]] = {}
+
+    def chain(self, model: str) -> list[str]:
+        return [model, *self.fallbacks.get(model, [])]
+
+    def delay(self, attempt: int) -> float:
+        d = min(self.max_backoff, self.backoff * 2**attempt)
+        return random.uniform(0, d) if self.jitter else d
+
+    def observe(self, model: str, latency: float) -> None:
+        if model not in self._latency:
+            self._latency[model] = deque(maxlen=self.window)
+        self._latency[model].append(latency)
+
+    def hedge_delay(self, model: str) -> float | None:
+        seen = self._latency.get(model)
+        if self.hedge is not None and seen and len(seen) >= self.min_samples:
+            ordered = sorted(seen)
+            return ordered[min(len(ordered) - 1, int(self.hedge * len(ordered)))]
+        return self.hedge_after
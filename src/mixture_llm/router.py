@@ -0,0 +1,144 @@
+"""Per-query model selection from live latency, error and cost statistics."""
+
+from __future__ import annotations
+
+import time
+from collections import deque
+from typing import Any
+
+from .hooks import Hooks
+
+
+class _Stats:
+    def __init__(self, window: int) -> None:
+        self.latencies: deque[float] = deque(maxlen=window)
+        self.failed: deque[bool] = deque(maxlen=window)
+        self.out_tokens: deque[int] = deque(maxlen=window)
+        self.streak = 0  # Consecutive failures
+        self.open_until = 0.0
+
+
+class Router(Hooks):
+    """Picks which models of a pool to call, given their recent behaviour.
+
+    ``prices`` maps models to ``(input, output)`` dollars per million tokens.
+    A model is skipped while its circuit is open, when its p95 latency
+    exceeds ``max_p95`` or its error rate exceeds ``max_error_rate`` over the
+    last ``window`` calls, or when it would push the step's estimated cost
+    past ``max_cost``. Latency and error limits apply once a model has
+    ``min_samples`` calls. ``failures`` consecutive errors or timeouts open
+    the circuit for ``cooldown`` seconds; until a call succeeds, each further
+    failure reopens it.
+
+    ``Route`` steps feed their own calls back; install the router in
+    ``hooks=`` as well to learn from every call of the run.
+    """
+
+    def __init__(
+        self,
+        prices: dict[str, tuple[float, float]] | None = None,
+        *,
+        max_cost: float | None = None,
+        max_p95: float | None = None,
+        max_error_rate: float | None = None,
+        failures: int = 5,
+        cooldown: float = 30.0,
+        window: int = 100,
+        min_samples: int = 5,
+    ) -> None:
+        self.prices = prices or {}
+        self.max_cost = max_cost
+        self.max_p95 = max_p95
+        self.max_error_rate = max_error_rate
+        self.failures = failures
+        self.cooldown = cooldown
+        self.window = window
+        self.min_samples = min_samples
+        self._stats: dict[str, _Stats] = {}
+
+    def _get(self, model: str) -> _Stats:
+        if model not in self._stats:
+            self._stats[model] = _Stats(self.window)
+        return self._stats[model]
+
+    def observe(self, info: dict[str, Any]) -> None:
+        """Record one ``llm_calls`` entry; cache hits and quorum/hedge cancellations are ignored."""
+        if info.get("cached") or info.get("cancelled") not in (None, "timeout"):
+            return
+        s = self._get(info["model"])
+        failed = "error" in info or "cancelled" in info
+        s.failed.append(failed)
+        if failed:
+            s.streak += 1
+            if s.streak >= self.failures:
+                s.open_until = time.monotonic() + self.cooldown
+            return
+        s.streak = 0
+        s.latencies.append(info["time"])
+        s.out_tokens.append(info["out_tokens"])
+
+    def on_call_end(self, run_id: str, pos: int, info: dict[str, Any]) -> None:
+        self.observe(info)
+
+    def on_call_error(self, run_id: str, pos: int, info: dict[str, Any]) -> None:
+        self.observe(info)
+
+    def p95(self, model: str) -> float | None:
+        s = self._stats.get(model)
+        if s is None or len(s.latencies) < self.min_samples:
+            return None
+        ordered = sorted(s.latencies)
+        return ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+
+    def error_rate(self, model: str) -> float | None:
+        s = self._stats.get(model)
+        if s is None or len(s.failed) < self.min_samples:
+            return None
+        return sum(s.failed) / len(s.failed)
+
+    def cost(self, model: str, in_tokens: int, max_tokens: int) -> float:
+        """Estimated dollars for one call, using the model's mean output length when known."""
+        s = self._stats.get(model)
+        out = sum(s.out_tokens) / len(s.out_tokens) if s and s.out_tokens else max_tokens
+        price_in, price_out = self.prices.get(model, (0.0, 0.0))
+        return (in_tokens * price_in + out * price_out) / 1e6
+
+    def _skip(self, model: str, now: float) -> str | None:
+        s = self._stats.get(model)
+        if s is not None and s.open_until > now:
+            return "circuit open"
+        p95 = self.p95(model)
+        if self.max_p95 is not None and p95 is not None and p95 > self.max_p95:
+            return f"p95 {p95:.2f}s"
+        rate = self.error_rate(model)
+        if self.max_error_rate is not None and rate is not None and rate > self.max_error_rate:
+            return f"error rate {rate:.0%}"
+        return None
+
+    def select(
+        self, pool: list[str], n: int | None = None, in_tokens: int = 0, max_tokens: int = 0
+    ) -> tuple[list[str], dict[str, str]]:
+        """Up to ``n`` models from ``pool`` in pool order, and why the others were skipped.
+
+        If every model is excluded, the one whose circuit reopens first (then
+        the lowest error rate) is returned so the step still runs.
+        """
+        now = time.monotonic()
+        chosen: list[str] = []
+        skipped: dict[str, str] = {}
+        spent = 0.0
+        for model in pool:
+            if n is not None and len(chosen) >= n:
+                break
+            reason = self._skip(model, now)
+            cost = self.cost(model, in_tokens, max_tokens)
+            if reason is None and self.max_cost is not None and spent + cost > self.max_cost:
+                reason = "over budget"
+            if reason is not None:
+                skipped[model] = reason
+                continue
+            chosen.append(model)
+            spent += cost
+        if not chosen and pool:
+            chosen = [min(pool, key=lambda m: (self._get(m).open_until, self.error_rate(m) or 0))]
+        return chosen, skipped
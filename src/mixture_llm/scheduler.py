@@ -0,0 +1,228 @@
+"""Concurrency caps and rate-limit token buckets for LLM calls."""
+
+from __future__ import annotations
+
+import asyncio
+import bisect
+import itertools
+import time
+from collections.abc import Callable
+from typing import Any, NamedTuple
+
+RATE_LIMIT_COOLDOWN = 1.0
+
+
+class Limit(NamedTuple):
+    concurrency: int | None = None
+    rpm: float | None = None
+    tpm: float | None = None
+
+
+class Ticket(NamedTuple):
+    model: str
+    tokens: int
+    wait: float
+    depth: int
+
+
+def provider_of(model: str) -> str:
+    """Default provider key: the ``org/`` prefix of OpenRouter-style names, else the model."""
+    return model.split("/", 1)[0] if "/" in model else model
+
+
+class _Bucket:
+    __slots__ = ("rate", "level", "stamp")
+
+    def __init__(self, per_minute: float) -> None:
+        self.rate = per_minute / 60.0
+        self.level = per_minute
+        self.stamp = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        cap = self.rate * 60.0
+        self.level = min(cap, self.level + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def delay(self, n: float) -> float:
+        # Oversized requests only need a full bucket; the surplus becomes debt.
+        need = min(n, self.rate * 60.0)
+        return 0.0 if self.level >= need else (need - self.level) / self.rate
+
+
+class _Gate:
+    __slots__ = ("limit", "active", "rpm", "tpm", "paused")
+
+    def __init__(self, limit: Limit) -> None:
+        self.limit = limit
+        self.active = 0
+        self.rpm = _Bucket(limit.rpm) if limit.rpm else None
+        self.tpm = _Bucket(limit.tpm) if limit.tpm else None
+        self.paused = 0.0
+
+    def delay(self, now: float, tokens: int) -> float | None:
+        """Seconds until a call fits, 0 if it fits now, None if blocked on concurrency."""
+        if self.limit.concurrency is not None and self.active >= self.limit.concurrency:
+            return None
+        wait = max(0.0, self.paused - now)
+        for bucket, n in ((self.rpm, 1), (self.tpm, tokens)):
+            if bucket:
+                bucket.refill(now)
+                wait = max(wait, bucket.delay(n))
+        return wait
+
+    def take(self, tokens: int) -> None:
+        self.active += 1
+        if self.rpm:
+            self.rpm.level -= 1
+        if self.tpm:
+            self.tpm.level -= tokens
+
+
+class _Waiter(NamedTuple):
+    order: tuple[int, int]
+    keys: tuple[Any, ...]
+    tokens: int
+    group: Any
+    fut: asyncio.Future[None]
+
+
+class Scheduler:
+    """Admits LLM calls under global, per-provider and per-model limits.
+
+    Waiting calls are queued rather than dropped. Calls sharing a limit are
+    admitted in order, interleaved round-robin across the pipelines (``group``)
+    that queued them, so one wide fan-out cannot starve concurrent runs.
+    A call that fails with a rate-limit error pauses its model for
+    ``cooldown`` seconds.
+    """
+
+    def __init__(
+        self,
+        models: dict[str, Limit] | None = None,
+        providers: dict[str, Limit] | None = None,
+        *,
+        default: Limit | None = None,
+        concurrency: int | None = None,
+        provider: Callable[[str], str] = provider_of,
+        cooldown: float = RATE_LIMIT_COOLDOWN,
+    ) -> None:
+        self.models = models or {}
+        self.providers = providers or {}
+        self.default = default or Limit()
+        self.provider = provider
+        self.cooldown = cooldown
+        self._gates: dict[Any, _Gate] = {}
+        if concurrency is not None:
+            self._gates[None] = _Gate(Limit(concurrency=concurrency))
+        self._queue: list[_Waiter] = []
+        self._queued: dict[Any, int] = {}
+        self._seq = itertools.count()
+        self._timer: asyncio.TimerHandle | None = None
+
+    @property
+    def depth(self) -> int:
+        return len(self._queue)
+
+    def _keys(self, model: str) -> tuple[Any, ...]:
+        keys: list[Any] = [("model", model)]
+        if ("model", model) not in self._gates:
+            self._gates[("model", model)] = _Gate(self.models.get(model, self.default))
+        prov = self.provider(model)
+        if prov in self.providers:
+            keys.append(("provider", prov))
+            if ("provider", prov) not in self._gates:
+                self._gates[("provider", prov)] = _Gate(self.providers[prov])
+        if None in self._gates:
+            keys.append(None)
+        return tuple(keys)
+
+    async def acquire(self, model: str, tokens: int, group: Any = None) -> Ticket:
+        t0 = time.monotonic()
+        keys = self._keys(model)
+        depth = len(self._queue)
+        n = self._queued.get(group, 0)
+        self._queued[group] = n + 1
+        fut: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        bisect.insort(self._queue, _Waiter((n, next(self._seq)), keys, tokens, group, fut))
+        self._dispatch()
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                self._release(keys)
+            else:
+                self._forget(fut, group)
+            raise
+        return Ticket(model, tokens, time.monotonic() - t0, depth)
+
+    def release(
+        self, ticket: Ticket, used: int | None = None, error: BaseException | None = None
+    ) -> None:
+        keys = self._keys(ticket.model)
+        if used is not None:
+            for key in keys:
+                if bucket := self._gates[key].tpm:
+                    bucket.level -= used - ticket.tokens
+        if error is not None and is_rate_limit(error):
+            gate = self._gates[keys[0]]
+            gate.paused = max(gate.paused, time.monotonic() + self.cooldown)
+        self._release(keys)
+
+    def _release(self, keys: tuple[Any, ...]) -> None:
+        for key in keys:
+            self._gates[key].active -= 1
+        self._dispatch()
+
+    def _forget(self, fut: asyncio.Future[None], group: Any) -> None:
+        for i, w in enumerate(self._queue):
+            if w.fut is fut:
+                del self._queue[i]
+                self._dequeued(group)
+                return
+
+    def _dequeued(self, group: Any) -> None:
+        left = self._queued[group] - 1
+        if left:
+            self._queued[group] = left
+        else:
+            del self._queued[group]
+
+    def _dispatch(self) -> None:
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        now = time.monotonic()
+        blocked: set[Any] = set()
+        retry: float | None = None
+        i = 0
+        while i < len(self._queue):
+            w = self._queue[i]
+            if w.fut.done():
+                del self._queue[i]
+                self._dequeued(w.group)
+                continue
+            if blocked.intersection(w.keys):
+                i += 1
+                continue
+            delays = [self._gates[k].delay(now, w.tokens) for k in w.keys]
+            if any(d is None or d > 0 for d in delays):
+                # Hold the saturated keys so later waiters cannot overtake this one.
+                blocked.update(k for k, d in zip(w.keys, delays, strict=True) if d is None or d > 0)
+                timed = [d for d in delays if d]
+                if timed and None not in delays:
+                    retry = min(retry, max(timed)) if retry is not None else max(timed)
+                i += 1
+                continue
+            for k in w.keys:
+                self._gates[k].take(w.tokens)
+            del self._queue[i]
+            self._dequeued(w.group)
+            w.fut.set_result(None)
+        if retry is not None:
+            self._timer = asyncio.get_running_loop().call_later(retry, self._dispatch)
+
+
+def is_rate_limit(error: BaseException) -> bool:
+    status = getattr(error, "status_code", None) or getattr(error, "status", None)
+    text = repr(error).lower()
+    return status == 429 or "429" in text or "rate limit" in text or "rate_limit" in text
@@ -0,0 +1,62 @@
+"""Near-duplicate detection with character shingles and bottom-k MinHash sketches."""
+
+from __future__ import annotations
+
+import heapq
+import re
+import zlib
+from collections import Counter
+from collections.abc import Callable
+
+K = 5  # Shingle length in characters
+SKETCH = 128  # Hashes kept per sketch
+
+
+def sketch(text: str, k: int = K, size: int = SKETCH) -> list[int]:
+    """Smallest ``size`` hashes of the text's ``k``-character shingles, sorted."""
+    text = re.sub(r"\s+", " ", text.lower()).strip()
+    grams = {text[i : i + k] for i in range(max(len(text) - k + 1, 1))}
+    return heapq.nsmallest(size, {zlib.crc32(g.encode()) for g in grams})
+
+
+def similarity(a: list[int], b: list[int], size: int = SKETCH) -> float:
+    """Estimated Jaccard similarity of the shingle sets behind two sketches."""
+    if not a or not b:
+        return float(a == b)
+    union = heapq.nsmallest(size, set(a) | set(b))
+    both = set(a) & set(b)
+    return sum(h in both for h in union) / len(union)
+
+
+def clusters(texts: list[str], threshold: float, k: int = K) -> list[list[int]]:
+    """Group indices of texts whose similarity to the group's first member is >= threshold.
+
+    Groups are ordered by their first member, which is the earliest text in the group.
+    """
+    groups: list[list[int]] = []
+    heads: list[list[int]] = []
+    for i, text in enumerate(texts):
+        s = sketch(text, k)
+        for group, head in zip(groups, heads, strict=True):
+            if similarity(s, head) >= threshold:
+                group.append(i)
+                break
+        else:
+            groups.append([i])
+            heads.append(s)
+    return groups
+
+
+def agreement(
+    texts: list[str], threshold: float = 0.9, normalize: Callable[[str], str] | None = None
+) -> float:
+    """Fraction of texts in the largest group of matching answers (0 when empty).
+
+    With ``normalize`` answers match when their normalized forms are equal,
+    otherwise when they are near-duplicates at ``threshold``.
+    """
+    if not texts:
+        return 0.0
+    if normalize is not None:
+        return max(Counter(map(normalize, texts)).values()) / len(texts)
+    return max(map(len, clusters(texts, threshold))) / len(texts)
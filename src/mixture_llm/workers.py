@@ -0,0 +1,266 @@
+"""Run pipelines across worker processes, each with its own event loop."""
+
+from __future__ import annotations
+
+import asyncio
+import multiprocessing
+import os
+import queue
+import sqlite3
+import time
+from collections.abc import Callable, Iterable, Iterator
+from multiprocessing.context import BaseContext
+from typing import Any, NamedTuple, Protocol, runtime_checkable
+
+from .core import DEFAULT_CONCURRENCY, Client, run
+from .history import History
+from .scheduler import Scheduler
+
+
+@runtime_checkable
+class JobQueue(Protocol):
+    def get(self) -> tuple[int, str] | None:
+        """Next ``(index, query)``, blocking if needed; ``None`` once there is no more work."""
+        ...
+
+    def ack(self, index: int, ok: bool) -> None: ...
+
+    def close(self, workers: int) -> None:
+        """Called by the parent after starting ``workers`` processes."""
+        ...
+
+
+class ProcessQueue:
+    """In-memory jobs on a ``multiprocessing`` queue, numbered in input order."""
+
+    def __init__(self, queries: Iterable[str], context: BaseContext | None = None) -> None:
+        self._q: Any = (context or multiprocessing.get_context()).Queue()
+        for job in enumerate(queries):
+            self._q.put(job)
+
+    def get(self) -> tuple[int, str] | None:
+        job: tuple[int, str] | None = self._q.get()
+        return job
+
+    def ack(self, index: int, ok: bool) -> None:
+        pass
+
+    def close(self, workers: int) -> None:
+        for _ in range(workers):
+            self._q.put(None)
+
+
+class SQLiteQueue:
+    """Jobs in a SQLite table that any number of processes (or hosts sharing the file) drain.
+
+    Jobs move from ``pending`` to ``running`` when claimed and to ``done`` or
+    ``failed`` when acknowledged. ``requeue()`` returns ``running`` jobs left
+    behind by a crash to ``pending``.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._db: sqlite3.Connection | None = None
+        self._pid = 0
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS jobs "
+            "(id INTEGER PRIMARY KEY, query TEXT NOT NULL, state TEXT NOT NULL DEFAULT 'pending')"
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        # Connections must not cross fork(); each process opens its own
+        if self._db is None or self._pid != os.getpid():
+            self._db = sqlite3.connect(
+                self.path, timeout=60, isolation_level=None, check_same_thread=False
+            )
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._pid = os.getpid()
+        return self._db
+
+    def __getstate__(self) -> dict[str, Any]:
+        return {"path": self.path, "_db": None, "_pid": 0}
+
+    def add(self, queries: Iterable[str]) -> None:
+        db = self._conn()
+        db.execute("BEGIN")
+        db.executemany("INSERT INTO jobs (query) VALUES (?)", ((q,) for q in queries))
+        db.execute("COMMIT")
+
+    def get(self) -> tuple[int, str] | None:
+        db = self._conn()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            row = db.execute(
+                "SELECT id, query FROM jobs WHERE state = 'pending' ORDER BY id LIMIT 1"
+            ).fetchone()
+            if row is not None:
+                db.execute("UPDATE jobs SET state = 'running' WHERE id = ?", (row[0],))
+        finally:
+            db.execute("COMMIT")
+        return (row[0], row[1]) if row is not None else None
+
+    def ack(self, index: int, ok: bool) -> None:
+        state = "done" if ok else "failed"
+        self._conn().execute("UPDATE jobs SET state = ? WHERE id = ?", (state, index))
+
+    def close(self, workers: int) -> None:
+        pass
+
+    def requeue(self) -> int:
+        cur = self._conn().execute("UPDATE jobs SET state = 'pending' WHERE state = 'running'")
+        return cur.rowcount
+
+    def counts(self) -> dict[str, int]:
+        rows = self._conn().execute("SELECT state, COUNT(*) FROM jobs GROUP BY state")
+        return dict(rows.fetchall())
+
+
+class WorkerStats(NamedTuple):
+    worker: int
+    pid: int
+    queries: int
+    failed: int
+    llm_calls: int
+    in_tokens: int
+    out_tokens: int
+    seconds: float
+
+
+async def _serve(
+    worker: int,
+    pipeline: list[Any],
+    make_client: Callable[[], Client],
+    jobs: JobQueue,
+    results: Any,
+    concurrency: int,
+    options: dict[str, Any],
+) -> None:
+    t0 = time.time()
+    client = make_client()
+    options.setdefault("scheduler", Scheduler(concurrency=concurrency))
+    slots = asyncio.Semaphore(concurrency)
+    tasks: set[asyncio.Task[None]] = set()
+    counts = {"queries": 0, "failed": 0, "llm_calls": 0, "in_tokens": 0, "out_tokens": 0}
+
+    async def one(index: int, query: str) -> None:
+        try:
+            result, history = await run(pipeline, query, client, **options)
+        except Exception as e:
+            counts["failed"] += 1
+            results.put(("failed", index, repr(e)))
+        else:
+            counts["queries"] += 1
+            for h in history:
+                for c in h["llm_calls"]:
+                    if c.get("cached") or c.get("coalesced"):
+                        continue
+                    counts["llm_calls"] += 1
+                    counts["in_tokens"] += c["in_tokens"]
+                    counts["out_tokens"] += c["out_tokens"]
+            results.put(("done", index, result, history))
+        finally:
+            slots.release()
+
+    try:
+        while True:
+            await slots.acquire()
+            job = await asyncio.to_thread(jobs.get)
+            if job is None:
+                break
+            task = asyncio.create_task(one(*job))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        await asyncio.gather(*tasks)
+    finally:
+        if (close := getattr(client, "aclose", None)) is not None:
+            await close()
+        stats = WorkerStats(worker, os.getpid(), seconds=time.time() - t0, **counts)
+        results.put(("stats", stats))
+
+
+def _worker(*args: Any) -> None:
+    asyncio.run(_serve(*args))
+
+
+class Workers:
+    """Runs ``pipeline`` over a job queue in ``processes`` worker processes.
+
+    Each worker builds its own client with ``make_client()`` (clients and
+    their connection pools can't be shared across processes), runs up to
+    ``concurrency`` queries at once on its own event loop and has its own
+    ``Scheduler`` unless one is passed in ``options``, which are forwarded to
+    ``run()``. With the ``spawn`` start method, the pipeline, factory and
+    options must be picklable.
+    """
+
+    def __init__(
+        self,
+        pipeline: list[Any],
+        make_client: Callable[[], Client],
+        *,
+        processes: int | None = None,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        start_method: str | None = None,
+        **options: Any,
+    ) -> None:
+        self.pipeline = pipeline
+        self.make_client = make_client
+        self.processes = processes or os.cpu_count() or 1
+        self.concurrency = concurrency
+        self.context: Any = multiprocessing.get_context(start_method)
+        self.options = options
+        self.stats: list[WorkerStats] = []
+        self.failed: dict[int, str] = {}
+
+    def map(self, jobs: Iterable[str] | JobQueue) -> Iterator[tuple[int, str, History]]:
+        """Yield ``(index, result, history)`` as queries finish, in completion order.
+
+        Plain iterables are numbered from 0. Failed queries are not yielded;
+        their errors are collected in ``failed`` and per-worker totals in
+        ``stats`` once the iterator is exhausted.
+        """
+        if not isinstance(jobs, JobQueue):
+            jobs = ProcessQueue(jobs, self.context)
+        results: Any = self.context.Queue()
+        procs = [
+            self.context.Process(
+                target=_worker,
+                args=(
+                    n,
+                    self.pipeline,
+                    self.make_client,
+                    jobs,
+                    results,
+                    self.concurrency,
+                    dict(self.options),
+                ),
+                daemon=True,
+            )
+            for n in range(self.processes)
+        ]
+        for p in procs:
+            p.start()
+        jobs.close(len(procs))
+        self.stats, self.failed = [], {}
+        try:
+            while len(self.stats) < len(procs):
+                try:
+                    msg = results.get(timeout=1.0)
+                except queue.Empty:
+                    if not any(p.is_alive() for p in procs):
+                        break
+                    continue
+                if msg[0] == "done":
+                    jobs.ack(msg[1], True)
+                    yield msg[1], msg[2], msg[3]
+                elif msg[0] == "failed":
+                    jobs.ack(msg[1], False)
+                    self.failed[msg[1]] = msg[2]
+                else:
+                    self.stats.append(msg[1])
+        finally:
+            for p in procs:
+                if p.is_alive() and len(self.stats) < len(procs):
+                    p.terminate()
+                p.join()
+        self.stats.sort()
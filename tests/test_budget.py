@@ -0,0 +1,62 @@
+import pytest
+
+from mixture_llm import Aggregate, Budget, Propose, Rank, run
+from mixture_llm.budget import dedupe, drop, estimate, truncate
+
+
+def test_truncate_is_proportional():
+    out = truncate(["a" * 400, "b" * 200], 75, estimate)
+    assert sum(map(estimate, out)) <= 75
+    assert len(out[0]) > len(out[1])
+    assert all(x.endswith("[...]") for x in out)
+
+
+def test_truncate_leaves_fitting_responses_alone():
+    responses = ["short", "also short"]
+    assert truncate(responses, 100, estimate) is responses
+
+
+def test_drop_keeps_leading_responses():
+    assert drop(["a" * 40, "b" * 40, "c" * 40], 25, estimate) == ["a" * 40, "b" * 40]
+    (only,) = drop(["a" * 400], 25, estimate)
+    assert estimate(only) <= 25
+
+
+def test_dedupe_removes_near_duplicates():
+    same = "the answer is forty two because of the reasons given"
+    out = dedupe([same, same.upper(), "something else entirely"], 1000, estimate)
+    assert out == [same, "something else entirely"]
+
+
+@pytest.mark.asyncio
+async def test_budget_bounds_aggregator_prompt():
+    prompts = {}
+
+    async def client(model, messages, temp, max_tokens):
+        prompts[model] = messages
+        return f"{model} " + "x" * 2000, 10, 10
+
+    pipeline = [Propose(["m1", "m2", "m3"]), Aggregate("agg", budget=Budget(300))]
+    await run(pipeline, "test", client)
+    assert sum(estimate(m["content"]) for m in prompts["agg"]) <= 300
+    for m in ("m1", "m2", "m3"):
+        assert m in prompts["agg"][1]["content"]
+
+
+@pytest.mark.asyncio
+async def test_prefix_cache_fits_budget_in_ranked_order():
+    async def client(model, messages, temp, max_tokens):
+        if model == "judge":
+            return "3, 2, 1", 10, 10
+        if model == "agg":
+            return messages[1]["content"], 10, 10
+        return model.upper() * 100, 10, 10
+
+    pipeline = [
+        Propose(["a", "b", "c"]),
+        Rank("judge", n=3),
+        Aggregate("agg", prompt="", budget=Budget(40, drop)),
+    ]
+    for prefix_cache in (False, True):
+        result, _ = await run(pipeline, "q", client, prefix_cache=prefix_cache)
+        assert "C" * 100 in result and "A" not in result and "BB" not in result
@@ -0,0 +1,77 @@
+import pytest
+
+from mixture_llm import Aggregate, Cache, Propose, run
+
+
+def counting_client():
+    calls = []
+
+    async def client(model, messages, temp, max_tokens):
+        calls.append(model)
+        return f"Response {len(calls)} from {model}", 10, 10
+
+    return client, calls
+
+
+@pytest.mark.asyncio
+async def test_rerun_hits_cache():
+    client, calls = counting_client()
+    cache = Cache()
+    pipeline = [Propose(["m1", "m2"]), Aggregate("agg")]
+    first, _ = await run(pipeline, "test", client, cache=cache)
+    second, history = await run(pipeline, "test", client, cache=cache)
+    assert first == second
+    assert len(calls) == 3
+    assert all(c["cached"] for h in history for c in h["llm_calls"])
+
+
+@pytest.mark.asyncio
+async def test_repeated_samples_stay_distinct():
+    client, calls = counting_client()
+    cache = Cache()
+    await run([Propose(["m1"] * 3)], "test", client, cache=cache)
+    _, history = await run([Propose(["m1"] * 3)], "test", client, cache=cache)
+    assert len(calls) == 3
+    assert len(set(history[0]["outputs"])) == 3
+
+
+@pytest.mark.asyncio
+async def test_sampled_opt_out():
+    client, calls = counting_client()
+    cache = Cache(sampled=False)
+    for _ in range(2):
+        await run([Propose(["m1"], temp=0.7)], "test", client, cache=cache)
+        await run([Propose(["m2"], temp=0)], "test", client, cache=cache)
+    assert calls.count("m1") == 2
+    assert calls.count("m2") == 1
+
+
+def test_lru_eviction_and_ttl(monkeypatch):
+    cache = Cache(maxsize=2, max_chars=10)
+    cache.set("a", "aaaa", 1, 1)
+    cache.set("b", "bbbb", 1, 1)
+    cache.get("a")
+    cache.set("c", "cccc", 1, 1)
+    assert cache.get("b") is None and cache.get("a") and cache.get("c")
+    cache.set("d", "dddddddd", 1, 1)
+    assert len(cache) == 1
+
+    now = [1000.0]
+    monkeypatch.setattr("mixture_llm.cache.time.time", lambda: now[0])
+    cache = Cache(ttl=5)
+    cache.set("a", "x", 1, 1)
+    now[0] += 10
+    assert cache.get("a") is None
+
+
+@pytest.mark.asyncio
+async def test_disk_tier_survives_restart(tmp_path):
+    client, calls = counting_client()
+    path = str(tmp_path / "cache.db")
+    cache = Cache(path=path)
+    await run([Propose(["m1"])], "test", client, cache=cache)
+    cache.close()
+    cache = Cache(path=path)
+    _, history = await run([Propose(["m1"])], "test", client, cache=cache)
+    assert len(calls) == 1
+    assert history[0]["llm_calls"][0]["cached"]
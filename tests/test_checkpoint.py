@@ -0,0 +1,100 @@
+import pytest
+
+from mixture_llm import (
+    Aggregate,
+    FileCheckpoint,
+    Map,
+    MemoryCheckpoint,
+    Propose,
+    Synthesize,
+    run,
+    run_many,
+)
+
+
+def counting_client():
+    calls = []
+
+    async def client(model, messages, temp, max_tokens):
+        calls.append(model)
+        return f"Response from {model}", 10, 10
+
+    return client, calls
+
+
+def flaky(fail):
+    def fn(text):
+        if fail:
+            raise RuntimeError("bug in user fn")
+        return text.upper()
+
+    return fn
+
+
+@pytest.mark.parametrize("store", [MemoryCheckpoint, FileCheckpoint])
+@pytest.mark.asyncio
+async def test_resume_skips_completed_steps(store, tmp_path):
+    checkpoint = store(str(tmp_path)) if store is FileCheckpoint else store()
+    client, calls = counting_client()
+    steps = [Propose(["m1", "m2"]), Synthesize(["s1", "s2"])]
+
+    with pytest.raises(RuntimeError):
+        await run(
+            [*steps, Map(flaky(True)), Aggregate("agg")],
+            "q",
+            client,
+            checkpoint=checkpoint,
+            resume="job-1",
+        )
+    assert len(calls) == 4
+
+    result, history = await run(
+        [*steps, Map(flaky(False)), Aggregate("agg")],
+        "q",
+        client,
+        checkpoint=checkpoint,
+        resume="job-1",
+    )
+    assert result == "Response from agg"
+    assert calls[4:] == ["agg"]
+    assert [h["step"] for h in history] == ["Propose", "Synthesize", "Map", "Aggregate"]
+    assert history[2]["outputs"] == ["RESPONSE FROM S1", "RESPONSE FROM S2"]
+    assert checkpoint.load("job-1") == history
+
+
+@pytest.mark.asyncio
+async def test_checkpoint_must_match_pipeline():
+    client, _ = counting_client()
+    checkpoint = MemoryCheckpoint()
+    await run([Propose(["m1"])], "q", client, checkpoint=checkpoint, resume="job")
+    with pytest.raises(ValueError, match="does not match"):
+        await run([Aggregate("agg")], "q", client, checkpoint=checkpoint, resume="job")
+
+
+@pytest.mark.asyncio
+async def test_run_many_keys_checkpoints_by_index():
+    client, calls = counting_client()
+    checkpoint = MemoryCheckpoint()
+    pipeline = [Propose(["m1"]), Aggregate("agg")]
+    for _ in range(2):
+        results = [
+            r
+            async for r in run_many(
+                pipeline, ["a", "b"], client, checkpoint=checkpoint, resume="batch"
+            )
+        ]
+    assert len(results) == 2
+    assert len(calls) == 4
+    assert checkpoint.load("batch/1") is not None
+
+
+@pytest.mark.asyncio
+async def test_checkpoint_requires_resume():
+    client, _ = counting_client()
+    checkpoint = MemoryCheckpoint()
+    with pytest.raises(ValueError, match="resume"):
+        await run([Propose(["m1"])], "q", client, checkpoint=checkpoint)
+    with pytest.raises(ValueError, match="resume"):
+        async for _ in run_many([Propose(["m1"])], ["q"] * 3, client, checkpoint=checkpoint):
+            pass
+    assert len(checkpoint) == 0
@@ -0,0 +1,136 @@
+import asyncio
+import json
+import re
+
+import pytest
+
+from mixture_llm import Aggregate, Propose, run, run_stream
+
+pytest.importorskip("httpx")
+
+from mixture_llm.clients import APIError, OpenAICompatible  # noqa: E402
+
+
+class StubServer:
+    """Minimal keep-alive HTTP/1.1 server speaking /chat/completions."""
+
+    def __init__(self):
+        self.connections = 0
+        self.requests = []
+
+    async def __aenter__(self):
+        self.server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+        port = self.server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}/v1"
+        return self
+
+    async def __aexit__(self, *exc):
+        self.server.close()
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        try:
+            while head := await reader.readuntil(b"\r\n\r\n"):
+                lines = head.decode().split("\r\n")
+                pairs = (line.split(": ", 1) for line in lines[1:] if line)
+                headers = {k.lower(): v for k, v in pairs}
+                length = int(headers.get("content-length", 0))
+                body = json.loads(await reader.readexactly(length))
+                self.requests.append((headers, body))
+                writer.write(self.respond(body))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    def respond(self, body):
+        text = f"{body['model']} says hi"
+        if body["model"] == "broken":
+            status, ctype, payload = (
+                "429 Too Many Requests",
+                "application/json",
+                b'{"error":"slow down"}',
+            )
+        elif body.get("stream"):
+            words = re.findall(r"\S+\s*", text)
+            chunks = [{"choices": [{"delta": {"content": w}}]} for w in words]
+            chunks.append({"choices": [], "usage": {"prompt_tokens": 5, "completion_tokens": 3}})
+            events = "".join(f"data: {json.dumps(c)}\n\n" for c in chunks) + "data: [DONE]\n\n"
+            status, ctype, payload = "200 OK", "text/event-stream", events.encode()
+        else:
+            data = {
+                "choices": [{"message": {"content": text}}],
+                "usage": {
+                    "prompt_tokens": 5,
+                    "completion_tokens": 3,
+                    "prompt_tokens_details": {"cached_tokens": 4},
+                },
+            }
+            status, ctype, payload = "200 OK", "application/json", json.dumps(data).encode()
+        head = (
+            f"HTTP/1.1 {status}\r\nContent-Type: {ctype}\r\nContent-Length: {len(payload)}\r\n\r\n"
+        )
+        return head.encode() + payload
+
+
+@pytest.mark.asyncio
+async def test_clients_share_a_keepalive_pool():
+    async with StubServer() as server:
+        a = OpenAICompatible(server.url, "key", concurrency=2, http2=False)
+        b = OpenAICompatible(server.url, "key", http2=False)
+        pipeline = [Propose(["m1", "m2"]), Aggregate("agg")]
+        for _ in range(3):
+            result, _ = await run(pipeline, "hello", a)
+            await b(model="m3", messages=[{"role": "user", "content": "hi"}], temp=0, max_tokens=9)
+        assert result == "agg says hi"
+        assert len(server.requests) == 12
+        assert server.connections <= 2
+        headers, body = server.requests[0]
+        assert headers["authorization"] == "Bearer key"
+        assert body["max_tokens"] == 2048
+        await a.aclose()
+        await b.aclose()
+
+
+@pytest.mark.asyncio
+async def test_streaming_and_errors():
+    async with StubServer() as server:
+        async with OpenAICompatible(server.url, http2=False) as client:
+            tokens = []
+            async for event in run_stream([Propose(["m1"]), Aggregate("agg")], "q", client):
+                if type(event).__name__ == "Token":
+                    tokens.append(event.text)
+                elif type(event).__name__ == "Done":
+                    calls = event.history[1]["llm_calls"]
+            assert "".join(tokens) == "agg says hi"
+            assert calls[0]["in_tokens"] == 5
+            with pytest.raises(APIError) as err:
+                await client(model="broken", messages=[], temp=0, max_tokens=1)
+            assert err.value.status_code == 429
+
+
+@pytest.mark.asyncio
+async def test_cache_markers_and_cached_tokens():
+    async with StubServer() as server:
+        plain = OpenAICompatible(server.url, http2=False)
+        marked = OpenAICompatible(server.url, http2=False, cache_control=True)
+        messages = [
+            {"role": "system", "content": "sys", "cache": True},
+            {"role": "user", "content": "u"},
+        ]
+        assert await plain(model="m", messages=messages, temp=0, max_tokens=9) == (
+            "m says hi",
+            5,
+            3,
+            4,
+        )
+        await marked(model="m", messages=messages, temp=0, max_tokens=9)
+        sent = [body["messages"] for _, body in server.requests]
+        assert sent[0] == [{"role": "system", "content": "sys"}, {"role": "user", "content": "u"}]
+        assert sent[1][0]["content"] == [
+            {"type": "text", "text": "sys", "cache_control": {"type": "ephemeral"}}
+        ]
+        assert sent[1][1] == {"role": "user", "content": "u"}
+        await plain.aclose()
+        await marked.aclose()
@@ -0,0 +1,114 @@
+import asyncio
+
+import pytest
+
+from mixture_llm import Aggregate, Filter, Propose, Retry, SingleFlight, run
+
+
+def slow_client(delay=0.05):
+    calls = []
+
+    async def client(model, messages, temp, max_tokens):
+        calls.append(model)
+        await asyncio.sleep(delay)
+        return f"Response from {model}", 10, 10
+
+    return client, calls
+
+
+@pytest.mark.asyncio
+async def test_concurrent_identical_runs_share_calls():
+    client, calls = slow_client()
+    flights = SingleFlight()
+    pipeline = [Propose(["m1", "m2"], temp=0), Aggregate("agg", temp=0)]
+    results = await asyncio.gather(
+        *(run(pipeline, "same", client, coalesce=flights) for _ in range(3))
+    )
+    assert len(calls) == 3
+    assert len({r for r, _ in results}) == 1
+    first, *rest = (h[0]["llm_calls"][0] for _, h in results)
+    assert first["fanout"] == 3
+    assert all(c["coalesced"] and c["in_tokens"] == 10 for c in rest)
+    assert len(flights) == 0
+
+
+@pytest.mark.asyncio
+async def test_sampled_calls_are_not_shared_by_default():
+    client, calls = slow_client()
+    flights = SingleFlight()
+    pipeline = [Propose(["m1"], temp=0.7)]
+    await asyncio.gather(*(run(pipeline, "same", client, coalesce=flights) for _ in range(2)))
+    assert len(calls) == 2
+    flights = SingleFlight(sampled=True)
+    await asyncio.gather(*(run(pipeline, "q", client, coalesce=flights) for _ in range(2)))
+    assert len(calls) == 3
+
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_does_not_cancel_shared_call():
+    client, calls = slow_client(0.1)
+    flights = SingleFlight()
+    pipeline = [Propose(["m1"], temp=0)]
+    first = asyncio.create_task(run(pipeline, "q", client, coalesce=flights))
+    await asyncio.sleep(0.01)
+    second = asyncio.create_task(run(pipeline, "q", client, coalesce=flights))
+    await asyncio.sleep(0.01)
+    first.cancel()
+    result, history = await second
+    assert result == "Response from m1"
+    assert history[0]["llm_calls"][0]["coalesced"]
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_hedge_sends_a_new_request():
+    delays = iter([0.3, 0.01])
+    calls = []
+
+    async def client(model, messages, temp, max_tokens):
+        calls.append(model)
+        await asyncio.sleep(next(delays))
+        return f"Response from {model}", 10, 10
+
+    t0 = asyncio.get_running_loop().time()
+    result, history = await run(
+        [Propose(["m1"], temp=0)],
+        "q",
+        client,
+        retry=Retry(hedge_after=0.05),
+        coalesce=SingleFlight(),
+    )
+    assert asyncio.get_running_loop().time() - t0 < 0.2
+    assert result == "Response from m1" and len(calls) == 2
+    hedge = history[0]["llm_calls"][1]
+    assert hedge["hedge"] and "coalesced" not in hedge
+
+
+class StreamingClient:
+    def __init__(self):
+        self.calls = 0
+
+    async def __call__(self, *, model, messages, temp, max_tokens):
+        return "unused", 0, 0
+
+    async def stream(self, *, model, messages, temp, max_tokens):
+        self.calls += 1
+        for _ in range(10):
+            await asyncio.sleep(0.005)
+            yield "word ", 0, 1
+        yield "", 10, 0
+
+
+@pytest.mark.asyncio
+async def test_filter_rejection_does_not_reach_other_runs():
+    client = StreamingClient()
+    flights = SingleFlight()
+    propose = Propose(["m"], temp=0)
+    short = Filter(lambda x: True, partial=lambda t: len(t) < 10)
+    (a, ha), (b, hb) = await asyncio.gather(
+        run([propose, short], "q", client, coalesce=flights),
+        run([propose], "q", client, coalesce=flights),
+    )
+    assert a == "" and ha[0]["llm_calls"][0]["cancelled"] == "filter"
+    assert b == "word " * 10 and "coalesced" not in hb[0]["llm_calls"][0]
+    assert client.calls == 2
@@ -1,6 +1,28 @@
+import asyncio
+import time
+
 import pytest
 
-from mixture_llm import Aggregate, Propose, Shuffle, Take, run
+from mixture_llm import (
+    Aggregate,
+    CallEnd,
+    Done,
+    Filter,
+    Gate,
+    Map,
+    Propose,
+    Sample,
+    Shuffle,
+    StepEnd,
+    StepStart,
+    Synthesize,
+    Take,
+    Token,
+    run,
+    run_many,
+    run_stream,
+)
+from mixture_llm.similarity import agreement
 
 
 async def mock_client(model, messages, temp, max_tokens):
@@ -20,3 +42,261 @@ async def test_transforms():
     pipeline = [Propose(["m1", "m2", "m3"]), Shuffle(), Take(2)]
     _, history = await run(pipeline, "test", mock_client)
     assert len(history[-1]["outputs"]) == 2
+
+
+@pytest.mark.asyncio
+async def test_run_many_bounded_completion_order():
+    state = {"active": 0, "peak": 0}
+
+    async def client(model, messages, temp, max_tokens):
+        state["active"] += 1
+        state["peak"] = max(state["peak"], state["active"])
+        await asyncio.sleep(0.05 if "slow" in messages[-1]["content"] else 0.001)
+        state["active"] -= 1
+        return f"Response from {model}", 10, 10
+
+    queries = (f"slow {i}" if i == 0 else f"q{i}" for i in range(20))
+    pipeline = [Propose(["m1", "m2", "m3"]), Aggregate("agg")]
+    seen = [i async for i, _, _ in run_many(pipeline, queries, client, concurrency=4)]
+    assert sorted(seen) == list(range(20))
+    assert seen[-1] == 0
+    assert state["peak"] <= 4
+
+
+@pytest.mark.asyncio
+async def test_run_stream_events():
+    pipeline = [Propose(["m1", "m2"]), Aggregate("agg")]
+    events = [e async for e in run_stream(pipeline, "test", mock_client)]
+    kinds = [type(e) for e in events]
+    assert kinds == [StepStart, CallEnd, CallEnd, StepEnd, StepStart, CallEnd, StepEnd, Done]
+    assert events[-1].result == "Response from agg"
+    assert len(events[-1].history) == 2
+
+
+class StreamingMock:
+    async def __call__(self, *, model, messages, temp, max_tokens):
+        return f"Response from {model}", 10, 10
+
+    async def stream(self, *, model, messages, temp, max_tokens):
+        for word in ["Streamed ", "from ", model]:
+            yield word, 0, 1
+        yield "", 10, 0
+
+
+@pytest.mark.asyncio
+async def test_run_stream_final_tokens():
+    pipeline = [Propose(["m1", "m2"]), Aggregate("agg")]
+    events = [e async for e in run_stream(pipeline, "test", StreamingMock())]
+    tokens = [e for e in events if isinstance(e, Token)]
+    assert [t.text for t in tokens] == ["Streamed ", "from ", "agg"]
+    assert all(t.pos == 1 for t in tokens)
+    done = events[-1]
+    assert done.result == "Streamed from agg"
+    assert done.history[1]["llm_calls"][0]["out_tokens"] == 3
+
+
+def delayed_client(delays):
+    async def client(model, messages, temp, max_tokens):
+        await asyncio.sleep(delays.get(model, 0))
+        return f"Response from {model}", 10, 10
+
+    return client
+
+
+@pytest.mark.asyncio
+async def test_propose_quorum_cancels_stragglers():
+    client = delayed_client({"slow": 5})
+    pipeline = [Propose(["m1", "slow", "m2"], quorum=2)]
+    _, history = await run(pipeline, "test", client)
+    assert history[0]["outputs"] == ["Response from m1", "Response from m2"]
+    calls = history[0]["llm_calls"]
+    assert calls[1]["cancelled"] == "quorum"
+    assert "error" not in calls[1]
+    assert history[0]["step_time"] < 1
+
+
+@pytest.mark.asyncio
+async def test_call_timeout_and_step_deadline():
+    client = delayed_client({"slow": 5, "mid": 0.2})
+    _, history = await run([Propose(["m1", "slow"], timeout=0.05)], "test", client)
+    assert [c.get("cancelled") for c in history[0]["llm_calls"]] == [None, "timeout"]
+
+    _, history = await run([Propose(["m1", "mid", "slow"], deadline=0.1)], "test", client)
+    assert history[0]["outputs"] == ["Response from m1"]
+    assert [c.get("cancelled") for c in history[0]["llm_calls"]] == [None, "deadline", "deadline"]
+
+
+@pytest.mark.asyncio
+async def test_overlapped_synthesize_starts_on_partial_input():
+    client = delayed_client({"slow": 0.3, "s1": 0.1, "s2": 0.1})
+    pipeline = [
+        Propose(["fast", "slow"]),
+        Synthesize(["s1"], start_after=1),
+        Synthesize(["s2"], start_after=1),
+    ]
+    t0 = time.perf_counter()
+    result, history = await run(pipeline, "test", client)
+    assert time.perf_counter() - t0 < 0.3 + 0.1
+    assert result == "Response from s2"
+    assert history[0]["outputs"] == ["Response from fast", "Response from slow"]
+    assert history[1]["llm_calls"][0]["saw"] == [0]
+    assert [r["step"] for r in history] == ["Propose", "Synthesize", "Synthesize"]
+
+
+@pytest.mark.asyncio
+async def test_overlapped_step_times_sum_to_wall_time():
+    client = delayed_client({"p": 0.1, "s1": 0.1, "s2": 0.1})
+    pipeline = [
+        Propose(["p"]),
+        Synthesize(["s1"], start_after=1),
+        Synthesize(["s2"], start_after=1),
+    ]
+    t0 = time.perf_counter()
+    _, history = await run(pipeline, "test", client)
+    wall = time.perf_counter() - t0
+    times = [h["step_time"] for h in history]
+    assert sum(times) <= wall
+    assert all(t >= 0.09 for t in times)
+
+
+@pytest.mark.asyncio
+async def test_overlapped_synthesize_start_by_deadline():
+    client = delayed_client({"m2": 0.05, "m3": 0.5})
+    pipeline = [Propose(["m1", "m2", "m3"]), Synthesize(["s1", "s2"], start_by=0.1)]
+    _, history = await run(pipeline, "test", client)
+    assert [c["saw"] for c in history[1]["llm_calls"]] == [[0, 1], [0, 1]]
+    assert len(history[0]["outputs"]) == 3
+
+
+@pytest.mark.asyncio
+async def test_gate_short_circuits_when_proposers_agree():
+    async def client(model, messages, temp, max_tokens):
+        return ("42" if model != "odd" else "17"), 10, 10
+
+    def agree(responses):
+        return agreement(responses, normalize=str.strip) >= 0.75
+
+    pipeline = [
+        Propose(["a", "b", "c"]),
+        Gate(agree, then=[Take(1)]),
+        Synthesize(["s"]),
+        Aggregate("agg"),
+    ]
+    result, history = await run(pipeline, "q", client)
+    assert result == "42"
+    assert [h["step"] for h in history] == ["Propose", "Gate", "Take"]
+    assert history[1]["branch"] == "then"
+
+    pipeline[0] = Propose(["a", "odd", "c", "odd"])
+    _, history = await run(pipeline, "q", client)
+    assert [h["step"] for h in history] == ["Propose", "Gate", "Synthesize", "Aggregate"]
+    assert history[1]["branch"] == "else"
+
+
+@pytest.mark.asyncio
+async def test_prefix_cache_layout_and_cached_tokens():
+    prompts = []
+
+    async def client(model, messages, temp, max_tokens):
+        if messages[0]["role"] == "system":
+            prompts.append(messages)
+            return f"{model} synth", 100, 5, 80
+        return f"{model} proposes", 10, 5
+
+    pipeline = [Propose(["b", "a"]), Shuffle(), Synthesize(["s1", "s2"]), Aggregate("agg")]
+    _, history = await run(pipeline, "q", client, prefix_cache=True)
+    assert prompts[0] == prompts[1]
+    system, user = prompts[0]
+    assert system["content"].endswith("Query: q") and system["cache"] and user["cache"]
+    assert user["content"] == "Responses:\n1. a proposes\n\n2. b proposes"
+    assert prompts[-1][0] == system
+    assert [c.get("cached_tokens") for c in history[2]["llm_calls"]] == [80, 80]
+    assert "cached_tokens" not in history[0]["llm_calls"][0]
+
+
+@pytest.mark.asyncio
+async def test_streaming_filter_cancels_mid_generation():
+    produced = {}
+
+    class Rambler:
+        async def __call__(self, *, model, messages, temp, max_tokens):
+            return "unused", 0, 0
+
+        async def stream(self, *, model, messages, temp, max_tokens):
+            words = 3 if model == "terse" else 1000
+            for n in range(words):
+                produced[model] = n + 1
+                yield "word ", 0, 1
+            yield "", 10, 0
+
+    short = Filter(lambda x: True, partial=lambda x: len(x) < 100)
+    _, history = await run([Propose(["terse", "verbose"]), short], "q", Rambler())
+    terse, verbose = history[0]["llm_calls"]
+    assert history[-1]["outputs"] == ["word word word "]
+    assert verbose["cancelled"] == "filter" and verbose["out_tokens"] == 25
+    assert produced["verbose"] == 20
+    assert terse["ttft"] <= terse["time"] and terse["tokens_per_sec"] > 0
+
+
+@pytest.mark.asyncio
+async def test_seeded_randomness_is_reproducible():
+    pipeline = [Propose([f"m{i}" for i in range(8)]), Shuffle(), Sample(4)]
+
+    async def outputs(**options):
+        _, history = await run(pipeline, "q", mock_client, **options)
+        return history[-1]["outputs"], history[1]["seed"]
+
+    assert await outputs(seed=7) == await outputs(seed=7)
+    assert (await outputs(seed=7))[0] != (await outputs(seed=8))[0]
+    by_query = await outputs(seed="query")
+    assert by_query == await outputs(seed="query")
+    order, seed = await outputs()
+    assert await outputs(seed=seed) == (order, seed)
+
+
+@pytest.mark.asyncio
+async def test_map_filter_offload():
+    def slow_upper(x):
+        time.sleep(0.1)
+        return x.upper()
+
+    async def is_upper(x):
+        await asyncio.sleep(0.01)
+        return x.isupper()
+
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    task = asyncio.create_task(ticker())
+    pipeline = [Propose(["m1", "m2", "m3", "m4"]), Map(slow_upper), Filter(is_upper)]
+    t0 = time.time()
+    result, history = await run(pipeline, "q", mock_client, executor="thread")
+    task.cancel()
+    assert result == "RESPONSE FROM M1"
+    assert time.time() - t0 < 0.3 and ticks >= 5
+    assert len(history[1]["item_times"]) == 4 and min(history[1]["item_times"]) >= 0.1
+
+    pipeline = [Propose(["m1"]), Map(str.upper, executor="process"), Filter(str.isupper)]
+    result, history = await run(pipeline, "q", mock_client)
+    assert result == "RESPONSE FROM M1"
+    assert len(history[2]["item_times"]) == 1
+
+
+@pytest.mark.asyncio
+async def test_async_callable_objects():
+    class AsyncPred:
+        async def __call__(self, x):
+            return x.endswith("m1")
+
+    class AsyncUpper:
+        async def __call__(self, x):
+            return x.upper()
+
+    pipeline = [Propose(["m1", "m2"]), Filter(AsyncPred()), Map(AsyncUpper())]
+    _, history = await run(pipeline, "q", mock_client)
+    assert history[-1]["outputs"] == ["RESPONSE FROM M1"]
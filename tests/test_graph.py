@@ -0,0 +1,84 @@
+import asyncio
+import time
+
+import pytest
+
+from mixture_llm import (
+    Aggregate,
+    Gate,
+    Hooks,
+    Node,
+    Propose,
+    Rank,
+    Shuffle,
+    Take,
+    Vote,
+    run_graph,
+)
+from mixture_llm.graph import interleave
+
+
+async def slow_client(model, messages, temp, max_tokens):
+    await asyncio.sleep(0.05)
+    return f"Response from {model}", 10, 10
+
+
+@pytest.mark.asyncio
+async def test_branches_run_concurrently_and_join():
+    graph = {
+        "a": Node(Propose(["a1", "a2"])),
+        "b": Node([Propose(["b1", "b2"]), Take(1)]),
+        "final": Node(Aggregate("agg"), after=("a", "b")),
+    }
+    t0 = time.perf_counter()
+    result, history = await run_graph(graph, "test", slow_client)
+    assert time.perf_counter() - t0 < 0.14
+    assert result == "Response from agg"
+    assert [r["node"] for r in history] == ["a", "b", "b", "final"]
+
+
+@pytest.mark.asyncio
+async def test_fork_rank_and_vote_then_merge():
+    async def judge(model, messages, temp, max_tokens):
+        replies = {"ranker": "2, 1", "voter": "consensus"}
+        return replies.get(model, f"Response from {model}"), 10, 10
+
+    graph = {
+        "p": Node(Propose(["m1", "m2", "m3"])),
+        "rank": Node(Rank("ranker", n=2), after=("p",)),
+        "vote": Node(Vote("voter"), after=("p",)),
+        "merged": Node(Take(3), after=("rank", "vote"), merge=interleave),
+    }
+    _, history = await run_graph(graph, "test", judge)
+    assert history[-1]["outputs"] == ["Response from m2", "consensus", "Response from m1"]
+
+
+@pytest.mark.asyncio
+async def test_invalid_graphs():
+    with pytest.raises(ValueError, match="unknown node"):
+        await run_graph({"a": Node(Take(1), after=("missing",))}, "q", slow_client)
+    with pytest.raises(ValueError, match="cycle"):
+        await run_graph(
+            {"a": Node(Take(1), after=("b",)), "b": Node(Take(1), after=("a",))}, "q", slow_client
+        )
+    with pytest.raises(ValueError, match="sink"):
+        await run_graph({"a": Node(Take(1)), "b": Node(Take(1))}, "q", slow_client)
+
+
+@pytest.mark.asyncio
+async def test_gate_branch_keeps_node_positions_apart():
+    class Positions(Hooks):
+        def __init__(self):
+            self.seen = []
+
+        def on_step_start(self, run_id, pos, step):
+            self.seen.append(pos)
+
+    hooks = Positions()
+    graph = {
+        "a": Node([Propose(["a1"]), Gate(lambda xs: True, then=[Take(1)] * 3)]),
+        "b": Node([Propose(["b1"]), Shuffle()]),
+    }
+    _, history = await run_graph(graph, "test", slow_client, output="a", hooks=[hooks])
+    assert [r["node"] for r in history] == ["a"] * 5 + ["b"] * 2
+    assert len(hooks.seen) == 7 == len(set(hooks.seen))
@@ -0,0 +1,68 @@
+import pytest
+
+from mixture_llm import Aggregate, History, MemoryCheckpoint, Propose, Shuffle, run
+
+
+async def mock_client(model, messages, temp, max_tokens):
+    return f"Response from {model}", 10, 10
+
+
+RECORDS = [
+    {
+        "step": "Propose",
+        "outputs": ["a", "b", "a"],
+        "llm_calls": [
+            {"model": "m1", "time": 1.0, "in_tokens": 5, "out_tokens": 7, "cached": True}
+        ],
+        "step_time": 1.0,
+    },
+    {
+        "step": "Dedupe",
+        "outputs": ["a", "b"],
+        "llm_calls": [],
+        "step_time": 0.0,
+        "clusters": [2, 1],
+    },
+]
+
+
+def test_history_round_trips_and_stores_texts_once():
+    history = History(RECORDS)
+    assert history.to_dicts() == RECORDS
+    assert history == RECORDS
+    assert history[-1]["clusters"] == [2, 1]
+    assert [h["step"] for h in history[:1]] == ["Propose"]
+    assert sorted(history.texts) == ["a", "b", "m1"]
+
+
+def test_history_detail_levels():
+    final = History(RECORDS, "final")
+    assert final[0]["outputs"] == [] and final[1]["outputs"] == ["a", "b"]
+    metrics = History(RECORDS, "metrics")
+    assert all(h["outputs"] == [] for h in metrics)
+    assert metrics[0]["llm_calls"] == RECORDS[0]["llm_calls"]
+    assert metrics.texts == ["m1"]
+
+
+@pytest.mark.asyncio
+async def test_run_returns_compact_history():
+    pipeline = [Propose(["m1", "m2"]), Shuffle(), Aggregate("agg")]
+    result, history = await run(pipeline, "test", mock_client, detail="final")
+    assert isinstance(history, History)
+    assert [len(h["outputs"]) for h in history] == [0, 0, 1]
+    assert history[-1]["outputs"] == [result]
+    assert sum(c["in_tokens"] for h in history for c in h["llm_calls"]) == 30
+
+
+@pytest.mark.asyncio
+async def test_run_drops_outputs_as_steps_end():
+    saved = []
+
+    class Checkpoint(MemoryCheckpoint):
+        def save(self, key, history):
+            saved.append([len(h["outputs"]) for h in history])
+            super().save(key, history)
+
+    pipeline = [Propose(["m1", "m2"]), Shuffle(), Aggregate("agg")]
+    await run(pipeline, "q", mock_client, detail="final", checkpoint=Checkpoint(), resume="job")
+    assert saved == [[2], [0, 2], [0, 0, 1]]
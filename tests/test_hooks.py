@@ -0,0 +1,140 @@
+import asyncio
+
+import pytest
+
+from mixture_llm import Aggregate, Hooks, Map, Propose, SingleFlight, run
+
+
+async def mock_client(model, messages, temp, max_tokens):
+    if model == "broken":
+        raise RuntimeError("boom")
+    return f"Response from {model}", 10, 10
+
+
+class Recorder(Hooks):
+    def __init__(self):
+        self.events = []
+
+    def on_run_start(self, run_id, query):
+        self.events.append(("run_start",))
+
+    def on_run_end(self, run_id, result, error):
+        self.events.append(("run_end", result, type(error).__name__ if error else None))
+
+    def on_step_start(self, run_id, pos, step):
+        self.events.append(("step_start", pos))
+
+    def on_step_end(self, run_id, pos, record):
+        self.events.append(("step_end", pos))
+
+    def on_call_start(self, run_id, pos, model):
+        self.events.append(("call_start", model))
+
+    def on_call_end(self, run_id, pos, info):
+        self.events.append(("call_end", info["model"]))
+
+    def on_call_error(self, run_id, pos, info):
+        self.events.append(("call_error", info["model"]))
+
+
+@pytest.mark.asyncio
+async def test_hook_sequence():
+    rec = Recorder()
+    await run([Propose(["m1", "broken"]), Aggregate("agg")], "test", mock_client, hooks=[rec])
+    assert rec.events == [
+        ("run_start",),
+        ("step_start", 0),
+        ("call_start", "m1"),
+        ("call_end", "m1"),
+        ("call_start", "broken"),
+        ("call_error", "broken"),
+        ("step_end", 0),
+        ("step_start", 1),
+        ("call_start", "agg"),
+        ("call_end", "agg"),
+        ("step_end", 1),
+        ("run_end", "Response from agg", None),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_hooks_see_progress_when_run_raises():
+    rec = Recorder()
+
+    def explode(text):
+        raise ValueError(text)
+
+    with pytest.raises(ValueError):
+        await run([Propose(["m1"]), Map(explode)], "test", mock_client, hooks=[rec])
+    assert ("call_end", "m1") in rec.events
+    assert rec.events[-1] == ("run_end", None, "ValueError")
+
+
+@pytest.mark.asyncio
+async def test_otel_spans_and_metrics():
+    pytest.importorskip("opentelemetry.sdk")
+    from opentelemetry.sdk.metrics import MeterProvider
+    from opentelemetry.sdk.metrics.export import InMemoryMetricReader
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+    from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+
+    from mixture_llm.otel import OTelHooks
+
+    exporter = InMemorySpanExporter()
+    tracer_provider = TracerProvider()
+    tracer_provider.add_span_processor(SimpleSpanProcessor(exporter))
+    reader = InMemoryMetricReader()
+    meter_provider = MeterProvider(metric_readers=[reader])
+    hooks = OTelHooks(tracer_provider.get_tracer("test"), meter_provider.get_meter("test"))
+
+    await run([Propose(["m1", "broken"]), Aggregate("agg")], "test", mock_client, hooks=[hooks])
+
+    spans = {s.name: s for s in exporter.get_finished_spans()}
+    root = spans["mixture_llm.run"]
+    step = spans["mixture_llm.step Propose"]
+    assert step.parent.span_id == root.context.span_id
+    calls = [s for s in exporter.get_finished_spans() if s.name == "mixture_llm.llm_call"]
+    assert len(calls) == 3
+    assert {c.parent.span_id for c in calls[:2]} == {step.context.span_id}
+
+    metrics = {
+        m.name: m
+        for rm in reader.get_metrics_data().resource_metrics
+        for sm in rm.scope_metrics
+        for m in sm.metrics
+    }
+    assert metrics["llm.call.errors"].data.data_points[0].attributes == {"model": "broken"}
+    assert sum(p.value for p in metrics["llm.tokens.input"].data.data_points) == 20
+
+
+@pytest.mark.asyncio
+async def test_otel_metrics_skip_coalesced_calls():
+    pytest.importorskip("opentelemetry.sdk")
+    from opentelemetry.sdk.metrics import MeterProvider
+    from opentelemetry.sdk.metrics.export import InMemoryMetricReader
+    from opentelemetry.sdk.trace import TracerProvider
+
+    from mixture_llm.otel import OTelHooks
+
+    async def slow_client(model, messages, temp, max_tokens):
+        await asyncio.sleep(0.02)
+        return "shared", 100, 10
+
+    reader = InMemoryMetricReader()
+    meter_provider = MeterProvider(metric_readers=[reader])
+    hooks = OTelHooks(TracerProvider().get_tracer("test"), meter_provider.get_meter("test"))
+    flights = SingleFlight()
+    pipeline = [Propose(["m1"], temp=0)]
+    await asyncio.gather(
+        *(run(pipeline, "q", slow_client, hooks=[hooks], coalesce=flights) for _ in range(5))
+    )
+
+    metrics = {
+        m.name: m
+        for rm in reader.get_metrics_data().resource_metrics
+        for sm in rm.scope_metrics
+        for m in sm.metrics
+    }
+    assert sum(p.value for p in metrics["llm.tokens.input"].data.data_points) == 100
+    assert sum(p.count for p in metrics["llm.call.duration"].data.data_points) == 1
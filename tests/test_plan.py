@@ -0,0 +1,72 @@
+import pytest
+
+from mixture_llm import (
+    Aggregate,
+    Budget,
+    Gate,
+    Propose,
+    Rank,
+    Route,
+    Router,
+    Shuffle,
+    Synthesize,
+    Take,
+    compile,
+)
+
+
+async def mock_client(model, messages, temp, max_tokens):
+    return f"Response from {model}", 10, 10
+
+
+def test_worst_case_calls_and_tokens():
+    pipeline = [
+        Propose(["a", "b", "c"], max_tokens=100),
+        Synthesize(["a", "b"], prompt="x" * 40, max_tokens=200),
+        Aggregate("agg", prompt="", max_tokens=50, budget=Budget(300)),
+    ]
+    plan = compile(pipeline, query_tokens=10)
+    assert [(s.fanin, s.fanout, s.calls) for s in plan.steps] == [(0, 3, 3), (3, 2, 2), (2, 1, 1)]
+    assert plan.steps[1].in_tokens == 2 * (10 + 10 + 300)
+    assert plan.steps[2].in_tokens == 300
+    assert (plan.calls, plan.out_tokens) == (6, 300 + 400 + 50)
+    assert plan.models["a"] == (2, 10 + 320, 300)
+    assert plan.cost({"agg": (1.0, 2.0)}) == pytest.approx((300 + 100) / 1e6)
+    assert plan.warnings == []
+
+
+def test_gate_takes_costlier_branch_and_route_caps_agents():
+    router = Router()
+    pipeline = [
+        Route(Propose(["a", "b", "c"], max_tokens=10), router, n=2),
+        Gate(lambda xs: True, then=[Aggregate("big", max_tokens=500)]),
+        Aggregate("small", max_tokens=5),
+    ]
+    plan = compile(pipeline, query_tokens=0)
+    assert plan.steps[0].calls == 2
+    assert len(plan.steps) == 3
+    assert plan.calls == 2 + 1 + 1
+    assert plan.out_tokens == 20 + 500 + 5
+
+
+def test_validation():
+    with pytest.raises(ValueError, match="Synthesize at step 0 has no input"):
+        compile([Synthesize(["a"])])
+    with pytest.raises(ValueError, match="no agents"):
+        compile([Propose([])])
+    with pytest.raises(TypeError, match="unknown step"):
+        compile([Propose(["a"]), "Aggregate"])
+    plan = compile([Propose(["a", "b"]), Shuffle(), Rank("judge", n=3), Take(5)])
+    assert plan.warnings == [
+        "Rank at step 2 keeps 3 of at most 2 responses",
+        "Take at step 3 keeps 5 of at most 2 responses",
+    ]
+    assert compile([Synthesize(["a"])], inputs=2).calls == 1
+
+
+@pytest.mark.asyncio
+async def test_plan_runs():
+    plan = compile([Propose(["m1", "m2"]), Aggregate("agg")])
+    result, history = await plan.run("q", mock_client)
+    assert result == "Response from agg"
+    assert len(history) == 2
@@ -0,0 +1,100 @@
+import asyncio
+
+import pytest
+
+from mixture_llm import Aggregate, Propose, Retry, run
+from mixture_llm.retry import is_retryable
+
+
+class StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+
+
+def flaky_client(failures):
+    calls = []
+
+    async def client(model, messages, temp, max_tokens):
+        calls.append(model)
+        if failures.get(model):
+            failures[model] -= 1
+            raise StatusError(502)
+        return f"Response from {model}", 10, 10
+
+    return client, calls
+
+
+@pytest.mark.asyncio
+async def test_retry_records_each_attempt():
+    client, calls = flaky_client({"m1": 2})
+    _, history = await run([Propose(["m1"])], "test", client, retry=Retry(backoff=0.001))
+    attempts = history[0]["llm_calls"]
+    assert history[0]["outputs"] == ["Response from m1"]
+    assert [a["attempt"] for a in attempts] == [1, 2, 3]
+    assert ["error" in a for a in attempts] == [True, True, False]
+
+
+@pytest.mark.asyncio
+async def test_fallback_chain_and_non_retryable():
+    client, calls = flaky_client({"primary": 99})
+    policy = Retry(2, backoff=0.001, fallbacks={"primary": ["backup"]})
+    _, history = await run([Propose(["primary"])], "test", client, retry=policy)
+    assert calls == ["primary", "primary", "backup"]
+    assert history[0]["outputs"] == ["Response from backup"]
+
+    async def bad_request(model, messages, temp, max_tokens):
+        raise StatusError(400)
+
+    _, history = await run([Propose(["primary"])], "test", bad_request, retry=policy)
+    assert [c["model"] for c in history[0]["llm_calls"]] == ["primary", "backup"]
+
+
+@pytest.mark.asyncio
+async def test_hedged_request_wins():
+    count = 0
+
+    async def client(model, messages, temp, max_tokens):
+        nonlocal count
+        count += 1
+        await asyncio.sleep(5 if count == 1 else 0.01)
+        return f"Response {count}", 10, 10
+
+    policy = Retry(hedge_after=0.05)
+    _, history = await run([Propose(["m1"])], "test", client, retry=policy)
+    first, second = history[0]["llm_calls"]
+    assert history[0]["outputs"] == ["Response 2"]
+    assert first["cancelled"] == "hedge" and second["hedge"]
+    assert history[0]["step_time"] < 1
+
+
+@pytest.mark.asyncio
+async def test_aggregate_is_hedged():
+    calls = []
+
+    async def client(model, messages, temp, max_tokens):
+        calls.append(model)
+        await asyncio.sleep(5 if calls.count("agg") == 1 and model == "agg" else 0.01)
+        return f"Response {len(calls)}", 10, 10
+
+    policy = Retry(hedge_after=0.05)
+    _, history = await run([Propose(["m1"]), Aggregate("agg")], "test", client, retry=policy)
+    first, second = history[1]["llm_calls"]
+    assert first["cancelled"] == "hedge" and second["hedge"]
+    assert history[1]["step_time"] < 1
+
+
+def test_retryable_classification():
+    assert is_retryable(StatusError(503))
+    assert is_retryable(StatusError(429))
+    assert not is_retryable(StatusError(401))
+    assert is_retryable(ConnectionError())
+    assert not is_retryable(ValueError("bad"))
+
+
+def test_hedge_delay_from_percentile():
+    policy = Retry(hedge=0.9, min_samples=10, hedge_after=3.0)
+    assert policy.hedge_delay("m") == 3.0
+    for i in range(10):
+        policy.observe("m", i / 10)
+    assert policy.hedge_delay("m") == 0.9
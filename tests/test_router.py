@@ -0,0 +1,49 @@
+import pytest
+
+from mixture_llm import Aggregate, Propose, Route, Router, run
+
+
+def info(model, time=1.0, **extra):
+    return {"model": model, "time": time, "in_tokens": 10, "out_tokens": 100, **extra}
+
+
+def test_slow_and_failing_models_are_skipped():
+    router = Router(max_p95=5.0, failures=3, min_samples=3)
+    for _ in range(5):
+        router.observe(info("fast"))
+        router.observe(info("slow", time=9.0))
+    for _ in range(3):
+        router.observe(info("down", error="502"))
+    router.observe(info("fast", cancelled="quorum"))
+
+    chosen, skipped = router.select(["down", "slow", "fast"])
+    assert chosen == ["fast"]
+    assert skipped == {"down": "circuit open", "slow": "p95 9.00s"}
+    assert router.select(["down"])[0] == ["down"]  # Never route to nothing
+
+
+def test_cost_budget_uses_prices_and_observed_output():
+    router = Router({"cheap": (1.0, 2.0), "pricey": (10.0, 30.0)}, max_cost=0.001)
+    router.observe(info("pricey"))
+    assert router.cost("pricey", 1000, 512) == pytest.approx(0.013)
+    assert router.cost("cheap", 1000, 512) == pytest.approx(0.002024)
+    assert router.select(["cheap", "pricey"], in_tokens=100, max_tokens=100)[0] == ["cheap"]
+
+
+@pytest.mark.asyncio
+async def test_route_step_learns_from_its_calls():
+    async def client(model, messages, temp, max_tokens):
+        if model == "flaky":
+            raise RuntimeError("503 unavailable")
+        return f"Response from {model}", 10, 10
+
+    router = Router(failures=2)
+    pipeline = [Route(Propose(["flaky", "m1", "m2"]), router, n=2), Aggregate("agg")]
+    for _ in range(2):
+        _, history = await run(pipeline, "q", client)
+        assert history[0]["routed"] == ["flaky", "m1"]
+    _, history = await run(pipeline, "q", client)
+    assert history[0]["step"] == "Route"
+    assert history[0]["routed"] == ["m1", "m2"]
+    assert history[0]["skipped"] == {"flaky": "circuit open"}
+    assert history[0]["outputs"] == ["Response from m1", "Response from m2"]
@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+from mixture_llm import Limit, Propose, Scheduler, run
+
+
+def tracking_client(delay=0.01):
+    state = {"active": 0, "peak": 0}
+
+    async def client(model, messages, temp, max_tokens):
+        state["active"] += 1
+        state["peak"] = max(state["peak"], state["active"])
+        await asyncio.sleep(delay)
+        state["active"] -= 1
+        return f"Response from {model}", 10, 10
+
+    return client, state
+
+
+@pytest.mark.asyncio
+async def test_model_concurrency_cap():
+    client, state = tracking_client()
+    sched = Scheduler({"m1": Limit(concurrency=2)})
+    _, history = await run([Propose(["m1"] * 6)], "test", client, scheduler=sched)
+    assert state["peak"] == 2
+    calls = history[0]["llm_calls"]
+    assert len(calls) == 6
+    assert all("queue_wait" in c and "queue_depth" in c for c in calls)
+    assert max(c["queue_wait"] for c in calls) > 0
+
+
+@pytest.mark.asyncio
+async def test_global_cap_shared_across_runs():
+    client, state = tracking_client()
+    sched = Scheduler(concurrency=3)
+    pipeline = [Propose(["m1", "m2", "m3", "m4"])]
+    results = await asyncio.gather(*(run(pipeline, "q", client, scheduler=sched) for _ in range(4)))
+    assert state["peak"] == 3
+    assert all(len(h[0]["outputs"]) == 4 for _, h in results)
+    assert sched.depth == 0
+
+
+@pytest.mark.asyncio
+async def test_rpm_bucket_delays_calls():
+    client, _ = tracking_client(0)
+    sched = Scheduler(default=Limit(rpm=120))  # burst of 120, then 2 per second
+    _, history = await run([Propose(["m1"] * 121)], "test", client, scheduler=sched)
+    waits = sorted(c["queue_wait"] for c in history[0]["llm_calls"])
+    assert waits[-1] > 0.3
+
+
+@pytest.mark.asyncio
+async def test_rate_limit_error_pauses_model():
+    calls = []
+
+    async def client(model, messages, temp, max_tokens):
+        calls.append(asyncio.get_running_loop().time())
+        if len(calls) == 1:
+            raise RuntimeError("Error code: 429 - rate limit exceeded")
+        return "ok", 1, 1
+
+    sched = Scheduler(default=Limit(concurrency=1), cooldown=0.2)
+    _, history = await run([Propose(["m1", "m1"])], "test", client, scheduler=sched)
+    assert "error" in history[0]["llm_calls"][0]
+    assert calls[1] - calls[0] >= 0.15
@@ -0,0 +1,88 @@
+import pytest
+
+from mixture_llm import Dedupe, Propose, Rank, Vote, run
+from mixture_llm.similarity import clusters, similarity, sketch
+
+BASE = (
+    "Photosynthesis converts light energy into chemical energy. Plants absorb "
+    "sunlight with chlorophyll and use it to turn water and carbon dioxide into "
+    "glucose and oxygen."
+)
+
+
+def test_similarity_estimates_overlap():
+    assert similarity(sketch(BASE), sketch(BASE)) == 1.0
+    assert similarity(sketch(BASE), sketch(BASE.replace("glucose", "sugar"))) > 0.8
+    assert similarity(sketch(BASE), sketch("Mitochondria are the powerhouse of the cell.")) < 0.2
+
+
+def test_clusters_keep_first_member_order():
+    texts = ["other answer entirely", BASE, BASE.upper(), "other answer  entirely!"]
+    assert clusters(texts, 0.9) == [[0, 3], [1, 2]]
+
+
+@pytest.mark.asyncio
+async def test_dedupe_records_cluster_sizes_for_vote():
+    prompts = []
+
+    async def client(model, messages, temp, max_tokens):
+        if model == "judge":
+            prompts.append(messages[1]["content"])
+            return "consensus", 10, 10
+        return (BASE if model == "same" else "A different view."), 10, 10
+
+    pipeline = [Propose(["same"] * 3 + ["other"]), Dedupe(), Vote("judge")]
+    result, history = await run(pipeline, "test", client)
+    assert history[1]["outputs"] == [BASE, "A different view."]
+    assert history[1]["clusters"] == [3, 1]
+    assert "(3 near-identical responses)" in prompts[0]
+    assert result == "consensus"
+
+
+def answers_client(answers):
+    calls = []
+
+    async def client(model, messages, temp, max_tokens):
+        calls.append(model)
+        return answers.get(model, "llm pick"), 10, 10
+
+    return client, calls
+
+
+@pytest.mark.asyncio
+async def test_local_vote_skips_llm_on_majority():
+    client, calls = answers_client({"a": "42", "b": " 42.", "c": "41"})
+    pipeline = [Propose(["a", "b", "c"]), Vote("judge", normalize=lambda s: s.strip(" ."))]
+    result, history = await run(pipeline, "test", client)
+    assert result == "42"
+    assert history[1]["votes"] == [2, 1]
+    assert "judge" not in calls
+
+
+@pytest.mark.asyncio
+async def test_local_vote_falls_back_without_agreement():
+    client, calls = answers_client({"a": "1", "b": "2", "c": "3"})
+    result, _ = await run([Propose(["a", "b", "c"]), Vote("judge", normalize=str)], "q", client)
+    assert result == "llm pick"
+    assert calls[-1] == "judge"
+
+
+@pytest.mark.asyncio
+async def test_local_vote_needs_a_strict_majority():
+    answers = {m: m for m in "abcd"} | {"e": "I cannot say", "f": "I cannot say"}
+    client, calls = answers_client(answers)
+    pipeline = [Propose(list("abcdef")), Vote("judge", normalize=str.strip)]
+    result, history = await run(pipeline, "q", client)
+    assert result == "llm pick"
+    assert calls[-1] == "judge"
+    assert "votes" not in history[1]
+
+
+@pytest.mark.asyncio
+async def test_local_rank_orders_by_votes():
+    client, calls = answers_client({"a": "x", "b": "y", "c": "y", "d": "z"})
+    pipeline = [Propose(["a", "b", "c", "d", "d"]), Rank(None, n=2)]
+    _, history = await run(pipeline, "q", client)
+    assert history[1]["outputs"] == ["y", "z"]
+    assert history[1]["votes"] == [2, 2, 1]
+    assert len(calls) == 5
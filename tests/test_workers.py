@@ -0,0 +1,60 @@
+import asyncio
+import os
+
+from mixture_llm import Aggregate, Cache, Map, Propose, Workers
+from mixture_llm.workers import SQLiteQueue
+
+
+class EchoClient:
+    async def __call__(self, *, model, messages, temp, max_tokens):
+        await asyncio.sleep(0.001)
+        return f"{model}:{os.getpid()}", 10, 5
+
+
+def make_client():
+    return EchoClient()
+
+
+def fail_on_boom(text):
+    if "boom" in text:
+        raise ValueError("boom")
+    return text
+
+
+PIPELINE = [Propose(["m1", "m2"]), Aggregate("agg")]
+
+
+def test_workers_spread_queries_across_processes():
+    workers = Workers(PIPELINE, make_client, processes=2, concurrency=4)
+    results = sorted(workers.map(f"q{i}" for i in range(20)))
+    assert [i for i, _, _ in results] == list(range(20))
+    assert all(r.startswith("agg:") for _, r, _ in results)
+    assert results[0][2][0]["step"] == "Propose"
+    assert sorted(s.worker for s in workers.stats) == [0, 1]
+    assert sum(s.queries for s in workers.stats) == 20
+    assert sum(s.llm_calls for s in workers.stats) == 60
+    assert not workers.failed
+
+
+def test_worker_stats_skip_cache_hits():
+    workers = Workers(PIPELINE, make_client, processes=1, concurrency=1, cache=Cache())
+    results = list(workers.map(["q"] * 3))
+    assert len(results) == 3
+    assert [s.llm_calls for s in workers.stats] == [3]
+    assert [s.in_tokens for s in workers.stats] == [30]
+
+
+def test_sqlite_queue_records_outcomes(tmp_path):
+    jobs = SQLiteQueue(str(tmp_path / "jobs.db"))
+    jobs.add(["fine", "boom", "also fine"])
+    pipeline = [Propose(["m1"]), Map(fail_on_boom)]
+
+    async def client(model, messages, temp, max_tokens):
+        return messages[0]["content"], 1, 1
+
+    workers = Workers(pipeline, lambda: client, processes=2)
+    done = {i: r for i, r, _ in workers.map(jobs)}
+    assert done == {1: "fine", 3: "also fine"}
+    assert "boom" in workers.failed[2]
+    assert jobs.counts() == {"done": 2, "failed": 1}
+    assert jobs.get() is None